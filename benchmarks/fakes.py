@@ -0,0 +1,234 @@
+"""Deterministic local stand-ins for the model and the Tavily client.
+
+Responses depend only on the seed and the request, latencies are drawn from
+lognormal distributions, so runs are repeatable and cost nothing.
+"""
+
+import asyncio
+import json
+import math
+import random
+import zlib
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_core.runnables import RunnableLambda
+
+from src.agent.searchtypes import Queries, SearchQuery, Section, Sections
+
+WORDS = (
+    "accelerator adoption analysis architecture bandwidth benchmark capacity chip cloud "
+    "compute cost customer data datacenter demand deployment design efficiency energy "
+    "forecast growth hardware inference investment latency market memory model network "
+    "performance platform power pricing processor quarter research revenue scale segment "
+    "semiconductor server share software supply throughput training vendor workload year"
+).split()
+
+
+@dataclass
+class Latency:
+    """Lognormal latency in seconds, given by its median and spread (sigma of the log)"""
+
+    median: float
+    sigma: float = 0.5
+
+    def sample(self, rng: random.Random) -> float:
+        if self.median <= 0:
+            return 0.0
+        return rng.lognormvariate(math.log(self.median), self.sigma)
+
+
+def _rng(seed: int, *parts: Any) -> random.Random:
+    key = "|".join(str(part) for part in parts)
+    return random.Random(seed ^ zlib.crc32(key.encode()))
+
+
+def _text(rng: random.Random, words: int) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(words))
+
+
+class FakeChatModel(BaseChatModel):
+    """Chat model answering every prompt with deterministic text after a sampled delay"""
+
+    seed: int = 0
+    latency: Latency = Latency(0.2)
+    section_words: int = 180
+    sections: int = 6
+    queries: int = 5
+    chunk_words: int = 4
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake"
+
+    def _prompt(self, messages: List[BaseMessage]) -> str:
+        return "\n".join(str(message.content) for message in messages)
+
+    def _answer(self, prompt: str) -> str:
+        rng = _rng(self.seed, "section", prompt)
+        paragraphs = [_text(rng, self.section_words // 3) for _ in range(3)]
+        return "## " + _text(rng, 3).title() + "\n\n" + "\n\n".join(paragraphs) + " $1.5B."
+
+    def _usage(self, prompt: str, answer: str) -> Dict[str, int]:
+        # about 4 characters per token
+        prompt_tokens, completion_tokens = len(prompt) // 4, len(answer) // 4
+        return {
+            "input_tokens": prompt_tokens,
+            "output_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+        }
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        prompt = self._prompt(messages)
+        answer = self._answer(prompt)
+        message = AIMessage(content=answer, usage_metadata=self._usage(prompt, answer))
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        prompt = self._prompt(messages)
+        await asyncio.sleep(self.latency.sample(_rng(self.seed, "latency", prompt)))
+        return self._generate(messages)
+
+    async def _astream(
+        self, messages, stop=None, run_manager=None, **kwargs
+    ) -> AsyncIterator[ChatGenerationChunk]:
+        prompt = self._prompt(messages)
+        answer = self._answer(prompt)
+        words = answer.split(" ")
+        chunks = [
+            " ".join(words[i : i + self.chunk_words]) + " "
+            for i in range(0, len(words), self.chunk_words)
+        ]
+        delay = self.latency.sample(_rng(self.seed, "latency", prompt)) / len(chunks)
+        for i, text in enumerate(chunks):
+            await asyncio.sleep(delay)
+            usage = self._usage(prompt, answer) if i == len(chunks) - 1 else None
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=text, usage_metadata=usage))
+            if run_manager:
+                await run_manager.on_llm_new_token(text, chunk=chunk)
+            yield chunk
+
+    def with_structured_output(self, schema, **kwargs):
+        async def respond(messages) -> Any:
+            prompt = self._prompt(messages)
+            rng = _rng(self.seed, schema.__name__, prompt)
+            await asyncio.sleep(self.latency.sample(rng))
+            if schema is Queries:
+                return Queries(
+                    queries=[SearchQuery(search_query=_text(rng, 6)) for _ in range(self.queries)]
+                )
+            if schema is Sections:
+                # introduction and conclusion without research, as the real planner does
+                names = ["Introduction"] + [_text(rng, 2).title() for _ in range(self.sections - 2)] + ["Conclusion"]
+                return Sections(
+                    sections=[
+                        Section(
+                            name=f"{i + 1}. {name}",
+                            description=_text(rng, 20),
+                            research=0 < i < len(names) - 1,
+                            content="",
+                        )
+                        for i, name in enumerate(names)
+                    ]
+                )
+            raise ValueError(f"No fake structured output for {schema.__name__}")
+
+        return RunnableLambda(lambda _: None, afunc=respond)
+
+
+class FakeSearchClient:
+    """Stand-in for tavily.TavilyClient returning deterministic pages after a sampled delay"""
+
+    def __init__(
+        self,
+        seed: int = 0,
+        latency: Latency = Latency(0.3),
+        page_words: int = 1500,
+        snippet_words: int = 20,
+        domains: int = 12,
+    ):
+        self.seed = seed
+        self.latency = latency
+        self.page_words = page_words
+        self.snippet_words = snippet_words
+        self.domains = domains
+        self.calls = 0
+        self.bytes = 0
+        # read by the server's lifespan logs
+        self.max_connections = 0
+        self.connections_created = 0
+
+    async def start(self):
+        pass
+
+    async def close(self):
+        pass
+
+    async def raw_results_async(
+        self,
+        query: str,
+        max_results: int = 5,
+        search_depth: str = "advanced",
+        include_answer: bool = False,
+        include_raw_content: bool = False,
+    ) -> Dict[str, Any]:
+        self.calls += 1
+        rng = _rng(self.seed, "search", query, max_results, search_depth)
+        # advanced searches take about twice as long, as Tavily's do
+        await asyncio.sleep(self.latency.sample(rng) * (2 if search_depth == "advanced" else 1))
+        results = []
+        for i in range(max_results):
+            # a few URLs come back for many queries, as popular pages do
+            page = rng.randrange(max_results * 40)
+            page_rng = _rng(self.seed, "page", page)
+            result = {
+                "url": f"https://site{page % self.domains}.example.com/{page}",
+                "title": _text(page_rng, 5).title(),
+                "content": _text(page_rng, self.snippet_words),
+                "score": round(1 - i / max_results, 2),
+            }
+            if include_raw_content:
+                result["raw_content"] = "\n\n".join(
+                    _text(page_rng, 100) for _ in range(max(1, self.page_words // 100))
+                )
+            results.append(result)
+        response = {"query": query, "results": results}
+        self.bytes += len(json.dumps(response))
+        return response
+
+
+def install(
+    seed: int = 0,
+    llm_latency: Optional[Latency] = None,
+    search_latency: Optional[Latency] = None,
+    page_words: int = 1500,
+    snippet_words: int = 20,
+    section_words: int = 180,
+    sections: int = 6,
+) -> FakeSearchClient:
+    """Swap bl_model and the Tavily client for the fakes, process-wide"""
+    from src.agent import models, tavily
+
+    llm = FakeChatModel(
+        seed=seed,
+        latency=llm_latency or Latency(0.2),
+        section_words=section_words,
+        sections=sections,
+    )
+
+    async def fake_bl_model(name: str) -> FakeChatModel:
+        return llm
+
+    models.bl_model = fake_bl_model
+    models._registry = None
+    search_client = FakeSearchClient(
+        seed=seed,
+        latency=search_latency or Latency(0.3),
+        page_words=page_words,
+        snippet_words=snippet_words,
+    )
+    tavily._search_client = search_client
+    return search_client
@@ -0,0 +1,238 @@
+"""Offline load test of the report pipeline.
+
+The model and Tavily are replaced by the deterministic fakes of
+benchmarks.fakes, so runs need no credentials, cost nothing and can be
+compared before and after a change. Reports are driven either straight
+through the graph (--mode graph) or through the FastAPI app and its SSE
+endpoint (--mode app), with at most --concurrency reports in flight.
+
+    python -m benchmarks.run --reports 20 --concurrency 5
+    python -m benchmarks.run --mode app --llm-latency 0.5 --json results.json
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import resource
+import statistics
+import sys
+import time
+import tracemalloc
+from typing import Any, Dict, List, Optional
+
+# the real clients are never called, but their settings are read at import time
+os.environ.setdefault("BL_WORKSPACE", "benchmark")
+os.environ.setdefault("BL_API_KEY", "benchmark")
+
+from .fakes import Latency, install  # noqa: E402
+
+
+def percentile(values: List[float], q: float) -> float:
+    """q-th percentile (0-100) with linear interpolation"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * q / 100
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+def _topic(i: int) -> str:
+    # a different topic per report, so the report and search caches never hit
+    return f"Benchmark topic {i}: market outlook for accelerator hardware"
+
+
+async def _graph_report(i: int, args) -> Dict[str, Any]:
+    from src.agent import stream_events
+    from src.inputs import DeepSearchInput
+
+    request = DeepSearchInput(inputs=_topic(i), stream_tokens=args.stream_tokens, no_cache=True)
+    result = {"sections": 0, "tokens": 0, "report_chars": 0, "error": None}
+    async for event in stream_events(request):
+        if event["event"] == "section":
+            result["sections"] += 1
+        elif event["event"] == "token":
+            result["tokens"] += 1
+        elif event["event"] == "final":
+            result["report_chars"] = len(event["report"])
+        elif event["event"] == "error":
+            result["error"] = event["message"]
+    return result
+
+
+async def _app_report(i: int, args, client) -> Dict[str, Any]:
+    body = {"inputs": _topic(i), "stream_tokens": args.stream_tokens, "no_cache": True}
+    result = {"sections": 0, "tokens": 0, "report_chars": 0, "error": None}
+    async with client.stream("POST", "/", json=body) as response:
+        if response.status_code != 200:
+            result["error"] = f"HTTP {response.status_code}"
+            return result
+        event = None
+        async for line in response.aiter_lines():
+            if line.startswith("event:"):
+                event = line[len("event:") :].strip()
+            elif line.startswith("data:"):
+                if event == "section":
+                    result["sections"] += 1
+                elif event == "token":
+                    result["tokens"] += 1
+                elif event == "final":
+                    result["report_chars"] = len(json.loads(line[len("data:") :])["report"])
+                elif event == "error":
+                    result["error"] = line[len("data:") :].strip()
+    return result
+
+
+async def _drive(args, report) -> List[Dict[str, Any]]:
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def timed(i: int) -> Dict[str, Any]:
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                result = await report(i)
+            except Exception as e:
+                result = {"sections": 0, "tokens": 0, "report_chars": 0, "error": repr(e)}
+            result["latency_seconds"] = time.perf_counter() - start
+            return result
+
+    return await asyncio.gather(*(timed(i) for i in range(args.reports)))
+
+
+async def run(args) -> Dict[str, Any]:
+    if not args.verbose:
+        # one progress line per node and section drowns the summary
+        logging.getLogger("src").setLevel(logging.WARNING)
+    search_client = install(
+        seed=args.seed,
+        llm_latency=Latency(args.llm_latency, args.latency_sigma),
+        search_latency=Latency(args.search_latency, args.latency_sigma),
+        page_words=args.page_words,
+        snippet_words=args.snippet_words,
+        section_words=args.section_words,
+        sections=args.sections,
+    )
+    if args.trace_memory:
+        tracemalloc.start()
+    usage_before = resource.getrusage(resource.RUSAGE_SELF)
+    start = time.perf_counter()
+
+    if args.mode == "graph":
+        from src.agent import use_checkpointer
+        from src.agent.checkpoint import close_checkpointer, init_checkpointer
+        from src.agent.models import init_models
+
+        # same checkpointer as the server (CHECKPOINTER, memory by default)
+        use_checkpointer(await init_checkpointer())
+        await init_models()
+        try:
+            results = await _drive(args, lambda i: _graph_report(i, args))
+        finally:
+            use_checkpointer(None)
+            await close_checkpointer()
+    else:
+        import httpx
+
+        from src.main import app
+
+        # the lifespan starts the installed fake search client like the real one
+        async with app.router.lifespan_context(app):
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(
+                transport=transport, base_url="http://benchmark", timeout=None
+            ) as client:
+                results = await _drive(args, lambda i: _app_report(i, args, client))
+
+    elapsed = time.perf_counter() - start
+    usage_after = resource.getrusage(resource.RUSAGE_SELF)
+    traced_peak = tracemalloc.get_traced_memory()[1] if args.trace_memory else None
+    if args.trace_memory:
+        tracemalloc.stop()
+
+    cpu = (usage_after.ru_utime - usage_before.ru_utime) + (
+        usage_after.ru_stime - usage_before.ru_stime
+    )
+    latencies = [result["latency_seconds"] for result in results]
+    failed = [result for result in results if result["error"] or not result["report_chars"]]
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    rss_unit = 1 if sys.platform == "darwin" else 1024
+    return {
+        "mode": args.mode,
+        "reports": args.reports,
+        "concurrency": args.concurrency,
+        "failed": len(failed),
+        "errors": sorted({result["error"] for result in failed if result["error"]}),
+        "seconds": elapsed,
+        "throughput_per_minute": len(results) / elapsed * 60 if elapsed else 0.0,
+        "latency_seconds": {
+            "p50": percentile(latencies, 50),
+            "p95": percentile(latencies, 95),
+            "p99": percentile(latencies, 99),
+            "mean": statistics.fmean(latencies) if latencies else 0.0,
+            "max": max(latencies, default=0.0),
+        },
+        "cpu_seconds": cpu,
+        "cpu_seconds_per_report": cpu / len(results) if results else 0.0,
+        "peak_rss_mb": usage_after.ru_maxrss * rss_unit / 2**20,
+        "peak_traced_mb": traced_peak / 2**20 if traced_peak is not None else None,
+        "search_calls": search_client.calls,
+        "search_bytes": search_client.bytes,
+        "sections_per_report": statistics.fmean(r["sections"] for r in results) if results else 0.0,
+        "token_events": sum(result["tokens"] for result in results),
+    }
+
+
+def _print_summary(summary: Dict[str, Any]):
+    latency = summary["latency_seconds"]
+    print(f"mode={summary['mode']} reports={summary['reports']} concurrency={summary['concurrency']}")
+    print(f"failed:      {summary['failed']} {summary['errors'] or ''}")
+    print(f"wall:        {summary['seconds']:.2f}s, {summary['throughput_per_minute']:.1f} reports/min")
+    print(
+        f"latency:     p50 {latency['p50']:.2f}s  p95 {latency['p95']:.2f}s  "
+        f"p99 {latency['p99']:.2f}s  max {latency['max']:.2f}s"
+    )
+    print(
+        f"cpu:         {summary['cpu_seconds']:.2f}s total, "
+        f"{summary['cpu_seconds_per_report'] * 1000:.0f}ms per report"
+    )
+    memory = f"peak RSS {summary['peak_rss_mb']:.0f}MB"
+    if summary["peak_traced_mb"] is not None:
+        memory += f", peak traced {summary['peak_traced_mb']:.1f}MB"
+    print(f"memory:      {memory}")
+    print(f"searches:    {summary['search_calls']}, {summary['search_bytes'] / 2**20:.1f}MB of results")
+
+
+def parse_args(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--mode", choices=("graph", "app"), default="graph")
+    parser.add_argument("--reports", type=int, default=10)
+    parser.add_argument("--concurrency", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--llm-latency", type=float, default=0.2, help="median seconds per model call")
+    parser.add_argument("--search-latency", type=float, default=0.3, help="median seconds per search")
+    parser.add_argument("--latency-sigma", type=float, default=0.5, help="lognormal spread of latencies")
+    parser.add_argument("--page-words", type=int, default=1500, help="raw content size of a search result")
+    parser.add_argument("--snippet-words", type=int, default=20, help="snippet size of a search result")
+    parser.add_argument("--section-words", type=int, default=180, help="size of a written section")
+    parser.add_argument("--sections", type=int, default=6, help="sections in the report plan")
+    parser.add_argument("--stream-tokens", action="store_true")
+    parser.add_argument("--trace-memory", action="store_true", help="also measure the peak Python heap (slower)")
+    parser.add_argument("--verbose", action="store_true", help="keep the agent's progress logs")
+    parser.add_argument("--json", metavar="PATH", help="write the summary as JSON to PATH")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None):
+    args = parse_args(argv)
+    summary = asyncio.run(run(args))
+    _print_summary(summary)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(summary, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,3 +1,27 @@
-from .agent import agent
+from .agent import (
+    agent,
+    claim_run,
+    get_run,
+    is_run_active,
+    refresh_events,
+    release_run,
+    resume_events,
+    run_status,
+    stream_events,
+    use_checkpointer,
+)
+from .batch import run_batch
 
-__all__ = ["agent"]
+__all__ = [
+    "agent",
+    "claim_run",
+    "get_run",
+    "is_run_active",
+    "refresh_events",
+    "release_run",
+    "resume_events",
+    "run_batch",
+    "run_status",
+    "stream_events",
+    "use_checkpointer",
+]
@@ -1,9 +1,16 @@
+import time
 from logging import getLogger
+from typing import Any, AsyncIterator, Dict, List, Optional
+from uuid import uuid4
 
+from langgraph.checkpoint.base import BaseCheckpointSaver
 from langgraph.graph import END, START, StateGraph
 from langgraph.graph.graph import RunnableConfig
+from langgraph.types import StateSnapshot
 
 from ..inputs import DeepSearchInput
+from .cache import get_report_cache, report_cache_key
+from .context import ReportContext
 from .llmlogic import (
     generate_queries,
     generate_report_plan,
@@ -11,19 +18,18 @@ from .llmlogic import (
     write_final_sections,
     write_section,
 )
+from .metrics import token_usage_handler
+from .refresh import RefreshInput, stale_sections
 from .searchtypes import (
     ReportState,
     ReportStateInput,
     ReportStateOutput,
+    Section,
     SectionOutputState,
     SectionState,
 )
-from .writer import (
-    compile_final_report,
-    format_completed_sections,
-    parallelize_final_section_writing,
-    parallelize_section_writing,
-)
+from .utils import section_payload
+from .writer import compile_final_report, parallelize_section_writing
 
 logger = getLogger(__name__)
 
@@ -42,51 +48,284 @@ builder = StateGraph(ReportState, input=ReportStateInput, output=ReportStateOutp
 
 builder.add_node("generate_report_plan", generate_report_plan)
 builder.add_node("section_builder_with_web_search", section_builder_subagent)
-builder.add_node("format_completed_sections", format_completed_sections)
 builder.add_node("write_final_sections", write_final_sections)
 builder.add_node("compile_final_report", compile_final_report)
 
 builder.add_edge(START, "generate_report_plan")
+# research and final sections are written in the same step, final sections
+# waiting only for the research sections they depend on
 builder.add_conditional_edges(
     "generate_report_plan",
     parallelize_section_writing,
-    ["section_builder_with_web_search"],
-)
-builder.add_edge("section_builder_with_web_search", "format_completed_sections")
-builder.add_conditional_edges(
-    "format_completed_sections",
-    parallelize_final_section_writing,
-    ["write_final_sections"],
+    ["section_builder_with_web_search", "write_final_sections", "compile_final_report"],
 )
+builder.add_edge("section_builder_with_web_search", "compile_final_report")
 builder.add_edge("write_final_sections", "compile_final_report")
 builder.add_edge("compile_final_report", END)
 
 reporter_agent = builder.compile()
 
+# nodes whose LLM tokens are streamed when the request asks for stream_tokens
+TOKEN_STREAM_NODES = {"write_section", "write_final_sections"}
 
-async def agent(request: DeepSearchInput):
-    config = RunnableConfig(
-        recursion_limit=request.recursion_limit,
+# runs that currently have a stream driving them
+_active_runs: set[str] = set()
+
+
+def use_checkpointer(checkpointer: Optional[BaseCheckpointSaver]):
+    """Checkpoint report runs so they can be resumed.
+
+    section_builder_subagent is compiled without its own checkpointer and
+    inherits this one, so finished sections are saved as soon as they complete.
+    """
+    reporter_agent.checkpointer = checkpointer
+
+
+def _run_config(
+    run_id: str, recursion_limit: int, report_plan_depth: int
+) -> RunnableConfig:
+    return RunnableConfig(
+        recursion_limit=recursion_limit,
+        # metadata is saved with each checkpoint, so a resumed run gets the same settings
         metadata={
-            "report_plan_depth": request.report_plan_depth,
+            "report_plan_depth": report_plan_depth,
+            "recursion_limit": recursion_limit,
         },
+        configurable={"thread_id": run_id, "report_context": ReportContext()},
+        # inherited by every model call of the run, to count tokens per node
+        callbacks=[token_usage_handler],
     )
-    message = {"topic": request.inputs}
-
-    # Stream both custom logs and final values
-    events = reporter_agent.astream(message, config, stream_mode=["custom", "values"])
-
-    async for mode, event in events:
-        if mode == "custom":
-            # Handle custom logs from nodes
-            if "log" in event:
-                yield f"{event['level']}: {event['log']}\n"
-        elif mode == "values":
-            # Handle state updates including final report
-            for k, v in event.items():
-                if k == "final_report":
-                    yield "INFO: Final Report\n"
-                    yield v
+
+
+async def _graph_events(
+    graph_input: Optional[Dict[str, Any]],
+    config: RunnableConfig,
+    stream_tokens: bool = False,
+) -> AsyncIterator[Dict[str, Any]]:
+    run_id = config["configurable"]["thread_id"]
+    stream_mode = ["custom", "values"]
+    if stream_tokens:
+        stream_mode.append("messages")
+    # Stream custom logs, finished sections and final values
+    events = reporter_agent.astream(graph_input, config, stream_mode=stream_mode)
+
+    _active_runs.add(run_id)
+    try:
+        async for mode, event in events:
+            if mode == "custom":
+                # Handle custom logs and sections from nodes
+                if event.get("event") in ("log", "section"):
+                    yield event
+            elif mode == "messages":
+                chunk, metadata = event
+                if metadata.get("langgraph_node") in TOKEN_STREAM_NODES and chunk.content:
+                    yield {
+                        "event": "token",
+                        "name": metadata.get("section_name"),
+                        "index": metadata.get("section_index"),
+                        "content": chunk.content,
+                    }
+            elif mode == "values":
+                # Handle state updates including final report
+                if "final_report" in event:
+                    yield {
+                        "event": "final",
+                        "report": event["final_report"],
+                        # with their sources, to refresh the report later
+                        "sections": [s.model_dump() for s in event.get("sections", [])],
+                    }
                     return
+    finally:
+        _active_runs.discard(run_id)
+
+    yield {
+        "event": "error",
+        "message": "No report found, you probably have an issue with tavily or openai connection",
+    }
+
+
+async def stream_events(
+    request: DeepSearchInput, run_id: Optional[str] = None
+) -> AsyncIterator[Dict[str, Any]]:
+    """Run the report graph and yield typed events as they happen.
+
+    Events are dicts with an "event" key: "run" first with the run id to
+    resume from (and "cached" set when the report comes from the report cache), "log" for progress lines, "section" for each section as soon
+    as it is written, "token" for LLM tokens of the section writers (only
+    with request.stream_tokens), "final" for the assembled report and its
+    sections (to refresh it later, see refresh_events) and "error" when no
+    report could be produced.
+    """
+    run_id = run_id or uuid4().hex
+    cache = get_report_cache()
+    key = report_cache_key(request.inputs, request.report_plan_depth)
+    cached = cache.get(key) if cache is not None and not request.no_cache else None
+    if cached is not None:
+        yield {"event": "run", "run_id": run_id, "cached": True}
+        for event in cached:
+            yield event
+        return
+
+    yield {"event": "run", "run_id": run_id}
+    config = _run_config(run_id, request.recursion_limit, request.report_plan_depth)
+    async for event in _cache_report(
+        _graph_events({"topic": request.inputs}, config, request.stream_tokens), key
+    ):
+        yield event
 
-    yield "No report found, you probably have an issue with tavily or openai connection\n"
+
+async def _cache_report(
+    events: AsyncIterator[Dict[str, Any]], key: str
+) -> AsyncIterator[Dict[str, Any]]:
+    """Pass events through, keeping the section and final ones in the report cache once the report is done"""
+    cache = get_report_cache()
+    # section and final events, replayed as they are for the next identical request
+    replay = []
+    async for event in events:
+        if event["event"] in ("section", "final"):
+            replay.append(event)
+            if event["event"] == "final" and cache is not None:
+                cache.set(key, replay)
+        yield event
+
+
+async def refresh_events(
+    request: RefreshInput, run_id: Optional[str] = None
+) -> AsyncIterator[Dict[str, Any]]:
+    """Bring a previous report up to date, writing again only its stale sections.
+
+    The previous plan is kept. Sections whose sources are still fresh (see
+    refresh.stale_sections) are sent right away as they were; the others are
+    researched and written as in a new run. Events are those of stream_events.
+    """
+    run_id = run_id or uuid4().hex
+    yield {"event": "run", "run_id": run_id}
+    stale = set(stale_sections(request.sections, request.max_age, request.changed_urls))
+    logger.info(
+        f"Refreshing report {run_id}: {len(stale)} of {len(request.sections)} sections are stale"
+    )
+    config = _run_config(run_id, request.recursion_limit, request.report_plan_depth)
+    context = config["configurable"]["report_context"]
+    # stale sections get pages fetched now, not the cached ones they were written from
+    context.fetched_after = time.time()
+    tracker = context.sections
+    sections, reuse, reused_events = [], [], []
+    for i, section in enumerate(request.sections):
+        if section.name in stale:
+            sections.append(section.model_copy(update={"content": "", "sources": []}))
+            continue
+        sections.append(section)
+        reuse.append(section.name)
+        # final sections written again wait for the reused research sections
+        tracker.complete(section)
+        reused_events.append(section_payload(section, i))
+
+    async def events() -> AsyncIterator[Dict[str, Any]]:
+        for event in reused_events:
+            yield event
+        graph_input = {"topic": request.inputs, "sections": sections, "reuse": reuse}
+        async for event in _graph_events(graph_input, config, request.stream_tokens):
+            yield event
+
+    # the refreshed report replaces a cached one for the same topic
+    async for event in _cache_report(
+        events(), report_cache_key(request.inputs, request.report_plan_depth)
+    ):
+        yield event
+
+
+async def get_run(run_id: str) -> Optional[StateSnapshot]:
+    """Return the last checkpoint of a run, or None if it is unknown"""
+    if reporter_agent.checkpointer is None:
+        return None
+    snapshot = await reporter_agent.aget_state({"configurable": {"thread_id": run_id}})
+    return snapshot if snapshot.values else None
+
+
+def is_run_active(run_id: str) -> bool:
+    return run_id in _active_runs
+
+
+def claim_run(run_id: str) -> bool:
+    """Mark a run as driven by a stream, returning False if one already drives it.
+
+    The stream only starts once the response is sent, so callers claim the
+    run first and release it when the response is done.
+    """
+    if run_id in _active_runs:
+        return False
+    _active_runs.add(run_id)
+    return True
+
+
+def release_run(run_id: str):
+    _active_runs.discard(run_id)
+
+
+def _completed_sections(snapshot: StateSnapshot) -> List[Section]:
+    # includes sections whose task finished during a step that did not complete
+    return snapshot.values.get("completed_sections", [])
+
+
+def run_status(run_id: str, snapshot: StateSnapshot) -> Dict[str, Any]:
+    if is_run_active(run_id):
+        status = "running"
+    elif "final_report" in snapshot.values:
+        status = "completed"
+    else:
+        status = "interrupted"
+    return {
+        "run_id": run_id,
+        "status": status,
+        "next": list(snapshot.next),
+        "sections": [s.name for s in snapshot.values.get("sections", [])],
+        "completed_sections": [s.name for s in _completed_sections(snapshot)],
+    }
+
+
+async def resume_events(
+    run_id: str, snapshot: StateSnapshot, stream_tokens: bool = False
+) -> AsyncIterator[Dict[str, Any]]:
+    """Replay the finished sections of a run, then continue it from its last checkpoint"""
+    yield {"event": "run", "run_id": run_id}
+    positions = {s.name: i for i, s in enumerate(snapshot.values.get("sections", []))}
+    for section in _completed_sections(snapshot):
+        yield section_payload(section, positions.get(section.name, -1))
+    if "final_report" in snapshot.values:
+        yield {
+            "event": "final",
+            "report": snapshot.values["final_report"],
+            "sections": [s.model_dump() for s in snapshot.values.get("sections", [])],
+        }
+        return
+
+    config = _run_config(
+        run_id,
+        snapshot.metadata.get("recursion_limit", 50),
+        snapshot.metadata.get("report_plan_depth", 8),
+    )
+    # final sections still to write wait for research sections finished before the interruption
+    tracker = config["configurable"]["report_context"].sections
+    for section in _completed_sections(snapshot):
+        tracker.complete(section)
+    async for event in _graph_events(None, config, stream_tokens):
+        yield event
+
+
+async def agent(request: DeepSearchInput):
+    """Stream the report as plain text lines"""
+    async for event in stream_events(request):
+        if event["event"] == "run":
+            yield f"INFO: Run {event['run_id']}\n"
+        elif event["event"] == "log":
+            yield f"{event['level']}: {event['log']}\n"
+        elif event["event"] == "section":
+            yield f"INFO: Section {event['index'] + 1}: {event['name']}\n"
+            yield f"{event['content']}\n\n"
+        elif event["event"] == "token":
+            yield event["content"]
+        elif event["event"] == "final":
+            yield "INFO: Final Report\n"
+            yield event["report"]
+        elif event["event"] == "error":
+            yield f"ERROR: {event['message']}\n"
@@ -0,0 +1,87 @@
+import asyncio
+import time
+from logging import getLogger
+from typing import Any, Dict, List, Tuple
+
+from ..inputs import DeepSearchInput
+from . import search
+from .agent import stream_events
+from .cache import normalize_query
+
+logger = getLogger(__name__)
+
+
+def _topic_key(request: DeepSearchInput) -> Tuple[str, int]:
+    # same topic and depth produce the same plan, so they are researched once
+    return normalize_query(request.inputs), request.report_plan_depth
+
+
+async def _run_report(request: DeepSearchInput) -> Dict[str, Any]:
+    start = time.perf_counter()
+    result = {"run_id": None, "report": None, "error": None}
+    try:
+        async for event in stream_events(request):
+            if event["event"] == "run":
+                result["run_id"] = event["run_id"]
+            elif event["event"] == "final":
+                result["report"] = event["report"]
+            elif event["event"] == "error":
+                result["error"] = event["message"]
+    except Exception as e:
+        logger.error(f"Error during batch report '{request.inputs}': {e}", exc_info=e)
+        result["error"] = str(e)
+    result["latency_seconds"] = time.perf_counter() - start
+    return result
+
+
+async def run_batch(requests: List[DeepSearchInput]) -> Dict[str, Any]:
+    """Generate reports for many topics together.
+
+    Identical topics (same normalized text and depth) are planned and
+    researched once, and their report is returned for each of them. All
+    reports run concurrently, so identical search queries from different
+    topics are sent to Tavily once (see search._search).
+    """
+    start = time.perf_counter()
+    shared_before = search.search_stats()["shared"]
+
+    groups: Dict[Tuple[str, int], List[int]] = {}
+    for i, request in enumerate(requests):
+        groups.setdefault(_topic_key(request), []).append(i)
+
+    leaders = []
+    for indexes in groups.values():
+        request = requests[indexes[0]]
+        leaders.append(
+            request.model_copy(
+                update={
+                    "recursion_limit": max(requests[i].recursion_limit for i in indexes),
+                    "stream_tokens": False,
+                }
+            )
+        )
+    results = await asyncio.gather(*(_run_report(request) for request in leaders))
+
+    items: List[Dict[str, Any]] = [{}] * len(requests)
+    for indexes, result in zip(groups.values(), results):
+        for i in indexes:
+            items[i] = {
+                "index": i,
+                "inputs": requests[i].inputs,
+                **result,
+                "shared_with": indexes[0] if i != indexes[0] else None,
+            }
+
+    latencies = [result["latency_seconds"] for result in results]
+    return {
+        "items": items,
+        "aggregate": {
+            "items": len(requests),
+            "reports_generated": len(results),
+            "failed": sum(1 for result in results if result["report"] is None),
+            "total_seconds": time.perf_counter() - start,
+            "mean_latency_seconds": sum(latencies) / len(latencies) if latencies else 0.0,
+            "max_latency_seconds": max(latencies, default=0.0),
+            "shared_searches": search.search_stats()["shared"] - shared_before,
+        },
+    }
@@ -0,0 +1,336 @@
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from logging import getLogger
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+logger = getLogger(__name__)
+
+
+class TTLCache:
+    """In-memory LRU cache whose entries expire after `ttl` seconds.
+
+    With max_bytes set, entries are also evicted while the sizes given by
+    sizeof add up to more than max_bytes, and a value larger than max_bytes
+    is not kept at all.
+    """
+
+    def __init__(
+        self,
+        max_size: int,
+        ttl: float,
+        max_bytes: int = 0,
+        sizeof: Optional[Callable[[Any], int]] = None,
+    ):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof
+        self.hits = 0
+        self.misses = 0
+        self.bytes = 0
+        self._entries: "OrderedDict[Hashable, Tuple[float, Any, int]]" = OrderedDict()
+
+    def _remove(self, key: Hashable):
+        _, _, size = self._entries.pop(key)
+        self.bytes -= size
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        expires_at, value, _ = entry
+        if expires_at < time.time():
+            self._remove(key)
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: Hashable, value: Any, expires_at: Optional[float] = None):
+        if self.max_size <= 0:
+            return
+        if key in self._entries:
+            self._remove(key)
+        size = self.sizeof(value) if self.sizeof is not None and self.max_bytes > 0 else 0
+        if self.max_bytes > 0 and size > self.max_bytes:
+            return
+        self._entries[key] = (expires_at or time.time() + self.ttl, value, size)
+        self.bytes += size
+        while len(self._entries) > self.max_size or (
+            self.max_bytes > 0 and self.bytes > self.max_bytes
+        ):
+            self._remove(next(iter(self._entries)))
+
+    def clear(self):
+        self._entries.clear()
+        self.bytes = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "bytes": self.bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+class SqliteCache:
+    """On-disk JSON cache tier, shared across restarts and worker processes.
+
+    Every `prune_every` writes, expired rows are deleted, then the least
+    recently used rows beyond max_rows, or beyond max_bytes of stored JSON,
+    are evicted (0 disables either bound).
+    """
+
+    def __init__(
+        self,
+        path: str,
+        ttl: float,
+        max_rows: int = 0,
+        max_bytes: int = 0,
+        prune_every: int = 100,
+    ):
+        self.path = path
+        self.ttl = ttl
+        self.max_rows = max_rows
+        self.max_bytes = max_bytes
+        self.prune_every = prune_every
+        self.hits = 0
+        self.misses = 0
+        self.evicted = 0
+        self._writes = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache "
+            "(key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+        )
+        # caches created before the size bound lack these columns
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(cache)")}
+        if "last_used" not in columns:
+            self._conn.execute("ALTER TABLE cache ADD COLUMN last_used REAL NOT NULL DEFAULT 0")
+        if "size" not in columns:
+            self._conn.execute("ALTER TABLE cache ADD COLUMN size INTEGER NOT NULL DEFAULT 0")
+            self._conn.execute("UPDATE cache SET size = length(value)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS cache_last_used ON cache (last_used)")
+        self._conn.commit()
+        with self._lock:
+            self._prune()
+
+    def _get(self, key: str) -> Optional[Tuple[float, Any]]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, expires_at FROM cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is not None and row[1] < now:
+                self._conn.execute("DELETE FROM cache WHERE key = ?", (key,))
+                row = None
+            elif row is not None:
+                self._conn.execute("UPDATE cache SET last_used = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return row[1], json.loads(row[0])
+
+    def _set(self, key: str, value: Any):
+        now = time.time()
+        text = json.dumps(value)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO cache (key, value, expires_at, last_used, size) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (key, text, now + self.ttl, now, len(text)),
+            )
+            self._writes += 1
+            if self._writes % self.prune_every == 0:
+                self._prune()
+            self._conn.commit()
+
+    def _prune(self):
+        """Delete expired rows, then the least recently used ones beyond the bounds (lock held)"""
+        deleted = self._conn.execute(
+            "DELETE FROM cache WHERE expires_at < ?", (time.time(),)
+        ).rowcount
+        if self.max_rows > 0 or self.max_bytes > 0:
+            deleted += self._conn.execute(
+                "DELETE FROM cache WHERE key IN ("
+                "SELECT key FROM ("
+                "SELECT key, ROW_NUMBER() OVER recent AS rank, SUM(size) OVER recent AS kept "
+                "FROM cache WINDOW recent AS (ORDER BY last_used DESC, key)"
+                ") WHERE (? > 0 AND rank > ?) OR (? > 0 AND kept > ?))",
+                (self.max_rows, self.max_rows, self.max_bytes, self.max_bytes),
+            ).rowcount
+        self._conn.commit()
+        self.evicted += deleted
+
+    async def get(self, key: str) -> Optional[Tuple[float, Any]]:
+        """Return (expires_at, value) for a live entry"""
+        return await asyncio.to_thread(self._get, key)
+
+    async def set(self, key: str, value: Any):
+        await asyncio.to_thread(self._set, key, value)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            rows, size = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM cache"
+            ).fetchone()
+        return {
+            "path": self.path,
+            "rows": rows,
+            "max_rows": self.max_rows,
+            "bytes": size,
+            "max_bytes": self.max_bytes,
+            "evicted": self.evicted,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+def normalize_query(query: str) -> str:
+    """Lowercase, collapse whitespace and drop trailing punctuation"""
+    return " ".join(query.lower().split()).strip(" ?.!\"'")
+
+
+def search_response_size(response: Any) -> int:
+    """Approximate size of a search response: the characters of its results' text fields"""
+    results = response.get("results", []) if isinstance(response, dict) else []
+    return sum(
+        len(result.get("url") or "")
+        + len(result.get("title") or "")
+        + len(result.get("content") or "")
+        + len(result.get("raw_content") or "")
+        for result in results
+        if isinstance(result, dict)
+    )
+
+
+class SearchCache:
+    """Search results cache: in-memory LRU in front of an optional SQLite tier.
+
+    Responses with raw page content weigh hundreds of KB, so both tiers are
+    bounded by bytes as well as by entry count.
+    """
+
+    def __init__(
+        self,
+        max_size: int,
+        ttl: float,
+        path: Optional[str] = None,
+        max_bytes: int = 0,
+        disk_max_rows: int = 0,
+        disk_max_bytes: int = 0,
+    ):
+        self.memory = TTLCache(max_size, ttl, max_bytes=max_bytes, sizeof=search_response_size)
+        self.disk = (
+            SqliteCache(path, ttl, max_rows=disk_max_rows, max_bytes=disk_max_bytes)
+            if path
+            else None
+        )
+
+    @staticmethod
+    def make_key(
+        query: str, max_results: int, search_depth: str, include_raw_content: bool
+    ) -> str:
+        return json.dumps(
+            [normalize_query(query), max_results, search_depth, include_raw_content]
+        )
+
+    async def get(self, key: str) -> Optional[Dict]:
+        value = self.memory.get(key)
+        if value is not None or self.disk is None:
+            return value
+        entry = await self.disk.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        # promote to the memory tier, keeping the on-disk expiry
+        self.memory.set(key, value, expires_at=expires_at)
+        return value
+
+    async def set(self, key: str, value: Dict):
+        self.memory.set(key, value)
+        if self.disk is not None:
+            await self.disk.set(key, value)
+
+    def close(self):
+        if self.disk is not None:
+            self.disk.close()
+
+    def stats(self) -> Dict[str, Any]:
+        stats = {"memory": self.memory.stats()}
+        if self.disk is not None:
+            stats["disk"] = self.disk.stats()
+        return stats
+
+
+_search_cache: Optional[SearchCache] = None
+
+
+def get_search_cache() -> Optional[SearchCache]:
+    """Return the process-wide search cache, or None when SEARCH_CACHE_SIZE is 0"""
+    global _search_cache
+    max_size = int(os.getenv("SEARCH_CACHE_SIZE", "1024"))
+    if max_size <= 0:
+        return None
+    if _search_cache is None:
+        _search_cache = SearchCache(
+            max_size=max_size,
+            ttl=float(os.getenv("SEARCH_CACHE_TTL", "3600")),
+            path=os.getenv("SEARCH_CACHE_PATH") or None,
+            max_bytes=int(os.getenv("SEARCH_CACHE_MAX_BYTES", str(64 * 2**20))),
+            disk_max_rows=int(os.getenv("SEARCH_CACHE_DISK_SIZE", "10000")),
+            disk_max_bytes=int(os.getenv("SEARCH_CACHE_DISK_BYTES", str(2**30))),
+        )
+        logger.info(
+            f"Search cache ready, max_size={max_size}, "
+            f"max_bytes={_search_cache.memory.max_bytes}, disk={_search_cache.disk is not None}"
+        )
+    return _search_cache
+
+
+def close_search_cache():
+    global _search_cache
+    if _search_cache is not None:
+        _search_cache.close()
+        _search_cache = None
+
+
+def report_cache_key(inputs: str, report_plan_depth: int) -> str:
+    return json.dumps([normalize_query(inputs), report_plan_depth])
+
+
+_report_cache: Optional[TTLCache] = None
+
+
+def get_report_cache() -> Optional[TTLCache]:
+    """Return the process-wide cache of finished reports, or None when REPORT_CACHE_SIZE is 0 (default)"""
+    global _report_cache
+    max_size = int(os.getenv("REPORT_CACHE_SIZE", "0"))
+    if max_size <= 0:
+        return None
+    if _report_cache is None:
+        _report_cache = TTLCache(
+            max_size=max_size, ttl=float(os.getenv("REPORT_CACHE_TTL", "3600"))
+        )
+        logger.info(f"Report cache ready, max_size={max_size}")
+    return _report_cache
@@ -0,0 +1,86 @@
+import os
+import time
+from collections import OrderedDict
+from contextlib import AsyncExitStack
+from logging import getLogger
+from typing import Any, Optional
+
+from langgraph.checkpoint.base import BaseCheckpointSaver
+from langgraph.checkpoint.memory import MemorySaver
+
+logger = getLogger(__name__)
+
+_exit_stack: Optional[AsyncExitStack] = None
+
+
+class BoundedMemorySaver(MemorySaver):
+    """MemorySaver that forgets runs instead of keeping every one until restart.
+
+    A run is dropped, least recently written first, once more than max_runs
+    are kept or when nothing was written to it for ttl seconds (0 disables
+    either bound). Eviction happens as checkpoints are written.
+    """
+
+    def __init__(self, max_runs: int, ttl: float, **kwargs: Any):
+        super().__init__(**kwargs)
+        self.max_runs = max_runs
+        self.ttl = ttl
+        self.evicted = 0
+        # thread id -> time of its last checkpoint, oldest first
+        self._written: "OrderedDict[str, float]" = OrderedDict()
+
+    def put(self, config, checkpoint, metadata, new_versions):
+        now = time.time()
+        thread_id = config["configurable"]["thread_id"]
+        self._written[thread_id] = now
+        self._written.move_to_end(thread_id)
+        self._evict(now)
+        return super().put(config, checkpoint, metadata, new_versions)
+
+    def _evict(self, now: float):
+        while self._written:
+            thread_id, written_at = next(iter(self._written.items()))
+            over_size = self.max_runs > 0 and len(self._written) > self.max_runs
+            expired = self.ttl > 0 and now - written_at > self.ttl
+            if not (over_size or expired):
+                break
+            del self._written[thread_id]
+            self.delete_thread(thread_id)
+            self.evicted += 1
+
+
+async def init_checkpointer() -> Optional[BaseCheckpointSaver]:
+    """Create the checkpointer selected by CHECKPOINTER (memory, sqlite or none)"""
+    global _exit_stack
+    kind = os.getenv("CHECKPOINTER", "memory")
+    if kind == "none":
+        return None
+    if kind == "memory":
+        checkpointer = BoundedMemorySaver(
+            max_runs=int(os.getenv("CHECKPOINTER_MAX_RUNS", "500")),
+            ttl=float(os.getenv("CHECKPOINTER_TTL", "86400")),
+        )
+    elif kind == "sqlite":
+        try:
+            from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
+        except ImportError as e:
+            raise RuntimeError(
+                "CHECKPOINTER=sqlite requires the langgraph-checkpoint-sqlite package"
+            ) from e
+        _exit_stack = AsyncExitStack()
+        checkpointer = await _exit_stack.enter_async_context(
+            AsyncSqliteSaver.from_conn_string(
+                os.getenv("CHECKPOINTER_PATH", "checkpoints.sqlite")
+            )
+        )
+    else:
+        raise ValueError(f"Unknown CHECKPOINTER: {kind}")
+    logger.info(f"Checkpointer ready: {kind}")
+    return checkpointer
+
+
+async def close_checkpointer():
+    global _exit_stack
+    if _exit_stack is not None:
+        await _exit_stack.aclose()
+        _exit_stack = None
@@ -0,0 +1,96 @@
+import asyncio
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+from langgraph.graph.graph import RunnableConfig
+
+from .dedup import QueryDeduper
+from .retrieval import PassageIndex
+from .searchtypes import Section
+from .sources import SourceStore
+
+
+class SectionTracker:
+    """Sections of a report as they are written, for the final sections waiting on them"""
+
+    def __init__(self):
+        self._done: Dict[str, Section] = {}
+        self._events: Dict[str, asyncio.Event] = {}
+
+    def _event(self, name: str) -> asyncio.Event:
+        event = self._events.get(name)
+        if event is None:
+            event = self._events[name] = asyncio.Event()
+        return event
+
+    def complete(self, section: Section):
+        self._done[section.name] = section
+        self._event(section.name).set()
+
+    async def wait_for(self, names: List[str]) -> List[Section]:
+        """Return the named sections, in order, once all of them are written"""
+        for name in names:
+            await self._event(name).wait()
+        return [self._done[name] for name in names]
+
+
+class BlobStore:
+    """Large texts of a report kept out of the graph state, which only carries their handle.
+
+    Everything in the graph state is copied into each checkpoint, so a
+    section's search context is stored here instead and read by the node
+    that needs it. The handle is a plain string and survives checkpoints;
+    the text does not, it lives as long as the report's ReportContext.
+    """
+
+    def __init__(self):
+        self._blobs: Dict[str, str] = {}
+        self._next = 0
+        self.bytes = 0
+        self.peak_bytes = 0
+
+    def put(self, text: str) -> str:
+        self._next += 1
+        handle = f"blob-{self._next}"
+        self._blobs[handle] = text
+        self.bytes += len(text)
+        self.peak_bytes = max(self.peak_bytes, self.bytes)
+        return handle
+
+    def get(self, handle: Optional[str]) -> Optional[str]:
+        return self._blobs.get(handle) if handle else None
+
+    def release(self, handle: Optional[str]):
+        text = self._blobs.pop(handle, None) if handle else None
+        if text is not None:
+            self.bytes -= len(text)
+
+    def __len__(self) -> int:
+        return len(self._blobs)
+
+
+@dataclass
+class ReportContext:
+    """Per-report objects shared by every node of one run, kept outside the graph state.
+
+    agent() creates one per request and passes it through
+    config["configurable"]["report_context"], which LangGraph forwards to the
+    section subgraphs started with Send().
+    """
+
+    sources: SourceStore = field(default_factory=SourceStore)
+    queries: QueryDeduper = field(default_factory=QueryDeduper)
+    passages: PassageIndex = field(default_factory=PassageIndex)
+    sections: SectionTracker = field(default_factory=SectionTracker)
+    blobs: BlobStore = field(default_factory=BlobStore)
+    # a refresh searches again instead of using results cached before it started
+    fetched_after: Optional[float] = None
+
+
+def get_report_context(config: RunnableConfig) -> ReportContext:
+    """Return the run's ReportContext, or a throwaway one when the graph is invoked directly"""
+    configurable = config.get("configurable") or {}
+    context = configurable.get("report_context")
+    if context is None:
+        context = ReportContext()
+    return context
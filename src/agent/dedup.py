@@ -0,0 +1,69 @@
+import os
+import re
+from typing import FrozenSet, List, Tuple
+
+from .cache import normalize_query
+
+# queries whose word sets overlap at least this much are searched once
+QUERY_DEDUP_THRESHOLD = float(os.getenv("QUERY_DEDUP_THRESHOLD", "0.75"))
+
+STOPWORDS = frozenset(
+    "a an and are as at by for from how in is of on or over the to what which with".split()
+)
+
+
+def query_shingles(query: str) -> FrozenSet[str]:
+    """Word shingles of a query: lowercased words, in any script, without stopwords or a plural s"""
+    words = set()
+    for word in re.findall(r"\w+", query.lower()):
+        if word in STOPWORDS:
+            continue
+        if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+            word = word[:-1]
+        words.add(word)
+    return frozenset(words)
+
+
+def jaccard(a: FrozenSet[str], b: FrozenSet[str]) -> float:
+    if not a and not b:
+        return 1.0
+    return len(a & b) / len(a | b)
+
+
+class QueryDeduper:
+    """Collapses near-duplicate search queries across the sections of one report.
+
+    Each query is compared with the queries already searched for the report;
+    a query close enough to one of them is replaced by it, so the search is
+    sent once and its results are shared through the search cache. Queries
+    mentioning different numbers (years, quarters...) are never merged, nor
+    are queries with no words left once stopwords are dropped, unless they
+    are the same query.
+    """
+
+    def __init__(self, threshold: float = QUERY_DEDUP_THRESHOLD):
+        self.threshold = threshold
+        self._queries: List[Tuple[str, FrozenSet[str], FrozenSet[str]]] = []
+        self.seen = 0
+        self.merged = 0
+
+    def canonical(self, query: str) -> str:
+        self.seen += 1
+        shingles = query_shingles(query)
+        # words with a digit, so "q3" and "h100" count as well as "2024"
+        numbers = frozenset(word for word in shingles if any(c.isdigit() for c in word))
+        for known, known_shingles, known_numbers in self._queries:
+            if not shingles or not known_shingles:
+                if normalize_query(query) == normalize_query(known):
+                    self.merged += 1
+                    return known
+                continue
+            if numbers == known_numbers and jaccard(shingles, known_shingles) >= self.threshold:
+                self.merged += 1
+                return known
+        self._queries.append((query, shingles, numbers))
+        return query
+
+    def dedupe(self, queries: List[str]) -> List[str]:
+        """Canonical form of each query, without repeats, in order"""
+        return list(dict.fromkeys(self.canonical(query) for query in queries))
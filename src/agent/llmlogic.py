@@ -1,10 +1,13 @@
 import logging
+from typing import List, Optional, Tuple
 
-from blaxel.langgraph import bl_model
 from langchain_core.messages import HumanMessage, SystemMessage
 from langgraph.config import get_stream_writer
 from langgraph.graph.graph import RunnableConfig
 
+from .context import ReportContext, get_report_context
+from .metrics import instrument_node
+from .models import get_model_registry
 from .prompts import (
     DEFAULT_REPORT_STRUCTURE,
     FINAL_SECTION_WRITER_PROMPT,
@@ -13,19 +16,65 @@ from .prompts import (
     REPORT_SECTION_QUERY_GENERATOR_PROMPT,
     SECTION_WRITER_PROMPT,
 )
-from .search import SearchQuery, format_search_query_results, run_search_queries
-from .searchtypes import Queries, ReportState, Sections, SectionState
-from .utils import log_event
+from .resilience import get_caller
+from .search import (
+    format_search_query_results,
+    index_search_results,
+    iter_search_results,
+    pack_passages,
+    query_text,
+    run_search_queries,
+)
+from .searchtypes import (
+    Queries,
+    ReportState,
+    SearchQuery,
+    Section,
+    Sections,
+    SectionSource,
+    SectionState,
+)
+from .utils import log_event, section_event
+from .writer import format_sections
+
+logger = logging.getLogger(__name__)
+
+
+async def _ainvoke(messages, schema: Optional[type] = None, metadata: Optional[dict] = None):
+    """Call the shared model (structured for schema) through the LLM limiter.
+
+    Calls have a deadline and are retried with backoff behind a circuit
+    breaker (see resilience.py); the model handle is refreshed before each retry.
+    """
+    models = get_model_registry()
 
-MODEL = "sandbox-openai"
+    async def attempt():
+        # count the tokens reported by the model (see metrics.py)
+        runnable = await models.get(schema)
+        if metadata:
+            # tag the call so streamed tokens can be traced back to their section
+            runnable = runnable.with_config(metadata=metadata)
+        return await runnable.ainvoke(messages)
 
+    # each attempt waits for a slot of the LLM limiter (see scheduler.py)
+    return await get_caller("llm").call(attempt, on_retry=lambda _: models.invalidate())
 
+
+@instrument_node
 async def generate_report_plan(state: ReportState, config: RunnableConfig):
     """Generate the overall plan for building the report"""
     writer = get_stream_writer()
-    llm = await bl_model(MODEL)
     topic = state["topic"]
 
+    if state.get("sections"):
+        # refresh of a previous report: keep its plan and its sections still up to date
+        reuse = set(state.get("reuse", []))
+        log_event(
+            writer,
+            f"--- Refreshing Report: reusing {len(reuse)} of {len(state['sections'])} sections ---",
+        )
+        return {"completed_sections": [s for s in state["sections"] if s.name in reuse]}
+
     log_event(
         writer,
         f"--- Generating Report Plan, report_plan_depth: {config['metadata']['report_plan_depth']} ---",
@@ -34,8 +83,6 @@ async def generate_report_plan(state: ReportState, config: RunnableConfig):
     report_structure = DEFAULT_REPORT_STRUCTURE
     number_of_queries = config["metadata"]["report_plan_depth"]
 
-    structured_llm = llm.with_structured_output(Queries)
-
     system_instructions_query = REPORT_PLAN_QUERY_GENERATOR_PROMPT.format(
         topic=topic,
         report_organization=report_structure,
@@ -43,19 +90,19 @@ async def generate_report_plan(state: ReportState, config: RunnableConfig):
     )
     try:
         # Generate queries
-        results = structured_llm.invoke(
+        results = await _ainvoke(
             [
                 SystemMessage(content=system_instructions_query),
                 HumanMessage(
                     content="Generate search queries that will help with planning the sections of the report."
                 ),
-            ]
+            ],
+            schema=Queries,
+        )
+        # Convert SearchQuery objects to strings, merging near-duplicates
+        query_list = get_report_context(config).queries.dedupe(
+            [query_text(query) for query in results.queries]
         )
-        # Convert SearchQuery objects to strings
-        query_list = [
-            query.search_query if isinstance(query, SearchQuery) else str(query)
-            for query in results.queries
-        ]
         # Search web and ensure we wait for results
         search_docs = await run_search_queries(
             query_list, num_results=5, include_raw_content=False
@@ -65,7 +112,9 @@ async def generate_report_plan(state: ReportState, config: RunnableConfig):
             search_context = "No search results available."
         else:
             search_context = format_search_query_results(
-                search_docs, include_raw_content=False
+                search_docs,
+                include_raw_content=False,
+                source_store=get_report_context(config).sources,
             )
         # Generate sections
         system_instructions_sections = REPORT_PLAN_SECTION_GENERATOR_PROMPT.format(
@@ -73,17 +122,20 @@ async def generate_report_plan(state: ReportState, config: RunnableConfig):
             report_organization=report_structure,
             search_context=search_context,
         )
-        structured_llm = llm.with_structured_output(Sections)
-        report_sections = structured_llm.invoke(
+        report_sections = await _ainvoke(
             [
                 SystemMessage(content=system_instructions_sections),
                 HumanMessage(
                     content="Generate the sections of the report. Your response must include a 'sections' field containing a list of sections. Each section must have: name, description, plan, research, and content fields."
                 ),
-            ]
+            ],
+            schema=Sections,
         )
 
         log_event(writer, "--- Generating Report Plan Completed ---")
+        # sources are only ever set by the section writers
+        for section in report_sections.sections:
+            section.sources = []
         return {"sections": report_sections.sections}
 
     except Exception as e:
@@ -91,11 +143,11 @@ async def generate_report_plan(state: ReportState, config: RunnableConfig):
         return {"sections": []}
 
 
+@instrument_node
 async def generate_queries(state: SectionState):
     """Generate search queries for a specific report section"""
 
     # Get state
-    llm = await bl_model(MODEL)
     section = state["section"]
     writer = get_stream_writer()
     log_event(
@@ -103,19 +155,18 @@ async def generate_queries(state: SectionState):
     )
     # Get configuration
     number_of_queries = 5
-    # Generate queries
-    structured_llm = llm.with_structured_output(Queries)
     # Format system instructions
     system_instructions = REPORT_SECTION_QUERY_GENERATOR_PROMPT.format(
         section_topic=section.description, number_of_queries=number_of_queries
     )
     # Generate queries
     user_instruction = "Generate search queries on the provided topic."
-    search_queries = structured_llm.invoke(
+    search_queries = await _ainvoke(
         [
             SystemMessage(content=system_instructions),
             HumanMessage(content=user_instruction),
-        ]
+        ],
+        schema=Queries,
     )
 
     log_event(
@@ -125,36 +176,77 @@ async def generate_queries(state: SectionState):
     return {"search_queries": search_queries.queries}
 
 
-async def search_web(state: SectionState):
-    """Search the web for each query, then return
-    a list of raw sources and a formatted string of sources."""
+async def _gather_section_context(
+    section: Section, search_queries: List[SearchQuery], context: ReportContext
+) -> Tuple[str, List[SectionSource]]:
+    """Search the section's queries and pack the report's passages most relevant to it.
+
+    Returns the packed text and the pages it quotes.
+    """
+    # queries paraphrasing ones already searched for this report reuse their results
+    query_list = context.queries.dedupe([query_text(query) for query in search_queries])
+    logger.info(
+        f"Searching {len(query_list)} of {len(search_queries)} queries "
+        f"({context.queries.merged} merged so far in this report)"
+    )
+    # Index each result for the report as it arrives; stragglers are cancelled
+    # once enough queries answered, so the section is not held up by the slowest one.
+    # Queries whose basic results already cover the section skip page content
+    async for search_doc in iter_search_results(
+        query_list,
+        num_results=6,
+        include_raw_content=True,
+        topic=section.description,
+        fetched_after=context.fetched_after,
+    ):
+        index_search_results(search_doc, context.sources, context.passages)
+    # Keep the passages of the report most relevant to the section
+    search_context, tokens, sources = pack_passages(
+        f"{section.name} {section.description}", context.sources, context.passages
+    )
+    logger.info(
+        f"Packed search context for section {section.name}: {tokens} tokens "
+        f"from {len(context.passages)} indexed passages"
+    )
+    return search_context, [
+        SectionSource(url=source.url, fetched_at=source.fetched_at) for source in sources
+    ]
+
+
+@instrument_node
+async def search_web(state: SectionState, config: RunnableConfig):
+    """Search the web for each query, then store the formatted sources
+    in the report's blob store and return their handle."""
 
     # Get state
-    search_queries = state["search_queries"]
+    context = get_report_context(config)
     writer = get_stream_writer()
     log_event(writer, "--- Searching Web for Queries ---")
 
-    search_docs = await run_search_queries(
-        search_queries, num_results=6, include_raw_content=True
-    )
-    # Deduplicate and format sources
-    search_context = format_search_query_results(
-        search_docs, max_tokens=4000, include_raw_content=True
+    search_context, sources = await _gather_section_context(
+        state["section"], state["search_queries"], context
     )
 
     log_event(writer, "--- Searching Web for Queries Completed ---")
-    return {"source_str": search_context}
+    # the text stays out of the graph state and its checkpoints
+    return {"source_ref": context.blobs.put(search_context), "sources": sources}
 
 
-async def write_section(state: SectionState):
+@instrument_node
+async def write_section(state: SectionState, config: RunnableConfig):
     """Write a section of the report"""
-    llm = await bl_model(MODEL)
-
     # Get state
     section = state["section"]
-    source_str = state["source_str"]
+    context = get_report_context(config)
     writer = get_stream_writer()
     log_event(writer, "--- Writing Section : " + section.name + " ---")
+    source_str = context.blobs.get(state.get("source_ref"))
+    sources = state.get("sources", [])
+    if source_str is None:
+        # resumed run: the blob went away with the interrupted run's context
+        source_str, sources = await _gather_section_context(
+            section, state["search_queries"], context
+        )
     # Format system instructions
     system_instructions = SECTION_WRITER_PROMPT.format(
         section_title=section.name,
@@ -163,28 +255,36 @@ async def write_section(state: SectionState):
     )
     # Generate section
     user_instruction = "Generate a report section based on the provided sources."
-    section_content = llm.invoke(
+    section_content = await _ainvoke(
         [
             SystemMessage(content=system_instructions),
             HumanMessage(content=user_instruction),
-        ]
+        ],
+        metadata={"section_name": section.name, "section_index": state["section_index"]},
     )
     # Write content to the section object
     section.content = section_content.content
+    section.sources = sources
 
     log_event(writer, "--- Writing Section : " + section.name + " Completed ---")
+    section_event(writer, section, state["section_index"])
+    context.blobs.release(state.get("source_ref"))
+    # unblock the final sections that depend on this one
+    context.sections.complete(section)
     # Write the updated section to completed sections
     return {"completed_sections": [section]}
 
 
-async def write_final_sections(state: SectionState):
+@instrument_node
+async def write_final_sections(state: SectionState, config: RunnableConfig):
     """Write the final sections of the report, which do not require web search and use the completed sections as context"""
-    llm = await bl_model(MODEL)
     # Get state
     section = state["section"]
-    completed_report_sections = state["report_sections_from_research"]
-
     writer = get_stream_writer()
+    # Wait for the research sections this one draws on, which run in the same step
+    dependencies = await get_report_context(config).sections.wait_for(state["depends_on"])
+    completed_report_sections = format_sections(dependencies)
+
     log_event(writer, "--- Writing Final Section: " + section.name + " ---")
     # Format system instructions
     system_instructions = FINAL_SECTION_WRITER_PROMPT.format(
@@ -195,16 +295,19 @@ async def write_final_sections(state: SectionState):
 
     # Generate section
     user_instruction = "Craft a report section based on the provided sources."
-    section_content = llm.invoke(
+    section_content = await _ainvoke(
         [
             SystemMessage(content=system_instructions),
             HumanMessage(content=user_instruction),
-        ]
+        ],
+        metadata={"section_name": section.name, "section_index": state["section_index"]},
     )
 
-    # Write content to section
+    # Write content to section; it is written from the other sections, not from web pages
     section.content = section_content.content
+    section.sources = []
 
     log_event(writer, "--- Writing Final Section: " + section.name + " Completed ---")
+    section_event(writer, section, state["section_index"])
     # Write the updated section to completed sections
     return {"completed_sections": [section]}
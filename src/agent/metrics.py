@@ -0,0 +1,173 @@
+import functools
+import inspect
+import time
+from collections import defaultdict
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from langchain_core.callbacks import AsyncCallbackHandler
+from langchain_core.outputs import LLMResult
+from opentelemetry import metrics as otel_metrics
+from opentelemetry import trace
+
+# Metrics are recorded twice: through the OpenTelemetry API (exported by the
+# platform's telemetry setup, no-op without one) and in this process for the
+# Prometheus text served on GET /metrics.
+tracer = trace.get_tracer("deepresearch")
+meter = otel_metrics.get_meter("deepresearch")
+
+DURATION_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+_registry: List["_Metric"] = []
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{value}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        _registry.append(self)
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels[name]) for name in self.labels)
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        super().__init__(name, help, labels)
+        self._values: Dict[Tuple[str, ...], float] = defaultdict(float)
+        self._otel = meter.create_counter(name, description=help)
+
+    def inc(self, amount: float = 1.0, **labels: str):
+        self._values[self._key(labels)] += amount
+        self._otel.add(amount, labels)
+
+    def render(self) -> List[str]:
+        lines = super().render()
+        for key, value in self._values.items():
+            lines.append(f"{self.name}{_format_labels(self.labels, key)} {value}")
+        return lines
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = (), buckets=DURATION_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(buckets)
+        self._counts: Dict[Tuple[str, ...], List[int]] = {}
+        self._sums: Dict[Tuple[str, ...], float] = defaultdict(float)
+        self._otel = meter.create_histogram(name, unit="s", description=help)
+
+    def observe(self, value: float, **labels: str):
+        key = self._key(labels)
+        counts = self._counts.get(key)
+        if counts is None:
+            counts = self._counts[key] = [0] * (len(self.buckets) + 1)
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                counts[i] += 1
+        counts[-1] += 1
+        self._sums[key] += value
+        self._otel.record(value, labels)
+
+    def render(self) -> List[str]:
+        lines = super().render()
+        for key, counts in self._counts.items():
+            for bound, count in zip((*self.buckets, "+Inf"), counts):
+                labels = _format_labels(self.labels, key, f'le="{bound}"')
+                lines.append(f"{self.name}_bucket{labels} {count}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labels, key)} {self._sums[key]}")
+            lines.append(f"{self.name}_count{_format_labels(self.labels, key)} {counts[-1]}")
+        return lines
+
+
+NODE_DURATION = Histogram(
+    "report_node_duration_seconds", "Time spent in each report graph node", ["node"]
+)
+NODE_ERRORS = Counter("report_node_errors_total", "Report graph node failures", ["node"])
+LLM_TOKENS = Counter(
+    "llm_tokens_total", "LLM tokens by graph node and kind (prompt or completion)", ["node", "kind"]
+)
+SEARCH_RESULT_BYTES = Counter("search_result_bytes_total", "Bytes received from the search API")
+QUEUE_WAIT = Histogram(
+    "provider_queue_wait_seconds", "Time calls waited for a provider slot", ["provider"]
+)
+
+# graph node running in the current task, to attribute LLM tokens
+current_node: ContextVar[Optional[str]] = ContextVar("current_node", default=None)
+
+
+def render_prometheus() -> str:
+    """All metrics in the Prometheus text exposition format"""
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+def instrument_node(fn):
+    """Time a graph node in an OpenTelemetry span and the node duration histogram"""
+    name = fn.__name__
+
+    if inspect.iscoroutinefunction(fn):
+
+        @functools.wraps(fn)
+        async def async_node(*args, **kwargs):
+            token = current_node.set(name)
+            start = time.perf_counter()
+            try:
+                with tracer.start_as_current_span(f"node {name}", attributes={"report.node": name}):
+                    return await fn(*args, **kwargs)
+            except Exception:
+                NODE_ERRORS.inc(node=name)
+                raise
+            finally:
+                NODE_DURATION.observe(time.perf_counter() - start, node=name)
+                current_node.reset(token)
+
+        return async_node
+
+    @functools.wraps(fn)
+    def node(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            with tracer.start_as_current_span(f"node {name}", attributes={"report.node": name}):
+                return fn(*args, **kwargs)
+        except Exception:
+            NODE_ERRORS.inc(node=name)
+            raise
+        finally:
+            NODE_DURATION.observe(time.perf_counter() - start, node=name)
+
+    return node
+
+
+class TokenUsageHandler(AsyncCallbackHandler):
+    """Counts the prompt and completion tokens reported by the model, per graph node"""
+
+    async def on_llm_end(self, response: LLMResult, **kwargs: Any):
+        node = current_node.get() or "unknown"
+        for generations in response.generations:
+            for generation in generations:
+                usage = getattr(getattr(generation, "message", None), "usage_metadata", None)
+                if usage:
+                    LLM_TOKENS.inc(usage.get("input_tokens", 0), node=node, kind="prompt")
+                    LLM_TOKENS.inc(usage.get("output_tokens", 0), node=node, kind="completion")
+
+
+token_usage_handler = TokenUsageHandler()
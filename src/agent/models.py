@@ -0,0 +1,95 @@
+import asyncio
+import time
+from logging import getLogger
+from typing import Any, Dict, Optional, Type
+
+from blaxel.langgraph import bl_model
+from langchain_core.runnables import Runnable
+
+from .searchtypes import Queries, Sections
+
+logger = getLogger(__name__)
+
+MODEL = "sandbox-openai"
+
+# schemas used with with_structured_output by the report nodes
+STRUCTURED_SCHEMAS = (Queries, Sections)
+
+
+class ModelRegistry:
+    """Resolved model client and its structured-output wrappers, shared by every node and request.
+
+    bl_model() and with_structured_output() run once and the results are
+    reused. invalidate() drops them so the next call resolves the model again.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._llm: Optional[Any] = None
+        self._structured: Dict[type, Runnable] = {}
+        self._lock = asyncio.Lock()
+        # instrumentation: model resolutions and the time spent setting up calls
+        self.resolutions = 0
+        self.refreshes = 0
+        self.lookups = 0
+        self.setup_seconds = 0.0
+
+    async def _resolve(self):
+        async with self._lock:
+            if self._llm is not None:
+                return
+            start = time.perf_counter()
+            llm = await bl_model(self.name)
+            structured = {schema: llm.with_structured_output(schema) for schema in STRUCTURED_SCHEMAS}
+            self._llm, self._structured = llm, structured
+            self.resolutions += 1
+            logger.info(
+                f"Model {self.name} resolved in {(time.perf_counter() - start) * 1000:.1f}ms"
+            )
+
+    async def get(self, schema: Optional[Type] = None) -> Runnable:
+        """Return the model, or its structured-output wrapper for schema"""
+        start = time.perf_counter()
+        if self._llm is None:
+            await self._resolve()
+        if schema is None:
+            runnable = self._llm
+        else:
+            runnable = self._structured.get(schema)
+            if runnable is None:
+                runnable = self._structured[schema] = self._llm.with_structured_output(schema)
+        self.lookups += 1
+        self.setup_seconds += time.perf_counter() - start
+        return runnable
+
+    def invalidate(self):
+        self._llm = None
+        self._structured = {}
+        self.refreshes += 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "model": self.name,
+            "resolutions": self.resolutions,
+            "refreshes": self.refreshes,
+            "lookups": self.lookups,
+            "avg_setup_ms": self.setup_seconds / self.lookups * 1000 if self.lookups else 0.0,
+        }
+
+
+_registry: Optional[ModelRegistry] = None
+
+
+def get_model_registry() -> ModelRegistry:
+    global _registry
+    if _registry is None:
+        _registry = ModelRegistry(MODEL)
+    return _registry
+
+
+async def init_models():
+    """Resolve the model at startup; failures are retried lazily on the first call"""
+    try:
+        await get_model_registry().get()
+    except Exception as e:
+        logger.warning(f"Could not resolve model {MODEL} at startup: {e}")
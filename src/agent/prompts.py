@@ -57,6 +57,7 @@ Now, generate the sections of the report. Each section should have the following
 - Description - Brief overview of the main topics and concepts to be covered in this section.
 - Research - Whether to perform web search for this section of the report or not.
 - Content - The content of the section, which you will leave blank for now.
+- Depends on - For sections without research, the names of the research sections it draws on. Leave it empty if it needs all of them.
 
 Consider which sections require web search.
 For example, introduction and conclusion will not require research because they will distill information from other parts of the report.
@@ -0,0 +1,54 @@
+import os
+import time
+from typing import Iterable, List, Optional
+
+from pydantic import Field
+
+from ..inputs import DeepSearchInput
+from .searchtypes import Section
+from .writer import final_section_dependencies
+
+# research sections quoting a page fetched longer ago than this (seconds) are written again
+REFRESH_MAX_AGE = float(os.getenv("REFRESH_MAX_AGE", "86400"))
+
+
+class RefreshInput(DeepSearchInput):
+    # sections of the previous report, as in its final event
+    sections: List[Section] = Field(min_length=1)
+    max_age: float = REFRESH_MAX_AGE
+    # pages known to have changed since the previous report
+    changed_urls: List[str] = []
+
+
+def stale_sections(
+    sections: List[Section],
+    max_age: float = REFRESH_MAX_AGE,
+    changed_urls: Iterable[str] = (),
+    now: Optional[float] = None,
+) -> List[str]:
+    """Names of the sections of a previous report to research and write again, in order.
+
+    A research section is stale when it has no content or recorded sources,
+    or when one of its sources changed or was fetched more than max_age
+    seconds ago. A section without research is stale when one of the
+    research sections it draws on is.
+    """
+    now = time.time() if now is None else now
+    changed = set(changed_urls)
+    stale = set()
+    for section in sections:
+        if not section.research:
+            continue
+        if not section.content or not section.sources or any(
+            source.url in changed
+            or source.fetched_at is None
+            or now - source.fetched_at > max_age
+            for source in section.sources
+        ):
+            stale.add(section.name)
+    for section in sections:
+        if section.research:
+            continue
+        if not section.content or stale & set(final_section_dependencies(section, sections)):
+            stale.add(section.name)
+    return [section.name for section in sections if section.name in stale]
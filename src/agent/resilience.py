@@ -0,0 +1,260 @@
+import asyncio
+import os
+import random
+import time
+from contextlib import nullcontext
+from logging import getLogger
+from typing import Any, AsyncContextManager, Awaitable, Callable, Dict, Optional, TypeVar
+
+from langchain_core.exceptions import OutputParserException
+from pydantic import ValidationError
+
+from .scheduler import get_limiter
+
+logger = getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a provider whose circuit breaker is open"""
+
+
+def is_retryable(error: BaseException) -> bool:
+    """Client errors (4xx other than 408 and 429) would fail again and say nothing about the provider's health"""
+    status = getattr(error, "status", None) or getattr(error, "status_code", None)
+    if isinstance(status, int) and 400 <= status < 500:
+        return status in (408, 429)
+    return True
+
+
+def is_provider_failure(error: BaseException) -> bool:
+    """Whether an error says the provider is unhealthy, as opposed to a bad request or answer.
+
+    Structured output that fails to parse or validate came from a provider
+    that answered: it is retried, but does not push the circuit toward open.
+    """
+    if isinstance(error, (OutputParserException, ValidationError)):
+        return False
+    return is_retryable(error)
+
+
+class CircuitBreaker:
+    """Opens after `failure_threshold` consecutive failures and fails calls fast for `reset_timeout` seconds.
+
+    After that a single trial call is let through (half-open): success closes
+    the circuit again, failure keeps it open for another reset_timeout.
+    """
+
+    def __init__(self, failure_threshold: int, reset_timeout: float):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._trial_running = False
+        self.opened = 0
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at < self.reset_timeout:
+            return "open"
+        return "half_open"
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half_open" and not self._trial_running:
+            self._trial_running = True
+            return True
+        return False
+
+    def release_trial(self):
+        self._trial_running = False
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self._trial_running = False
+
+    def record_failure(self):
+        self.failures += 1
+        if self._trial_running or (
+            self.opened_at is None and self.failures >= self.failure_threshold
+        ):
+            self.opened_at = time.monotonic()
+            self.opened += 1
+        self._trial_running = False
+
+
+class ResilientCaller:
+    """Deadline, retries with exponential backoff, optional hedging and a circuit breaker for one provider.
+
+    Each attempt must finish within `timeout` seconds. With `hedge_after`
+    set, a duplicate request is started if the first one has not answered
+    after that many seconds, and the first answer wins. Failed attempts are
+    retried up to `retries` times, waiting backoff * 2**attempt seconds
+    (with jitter) in between.
+
+    With `slot` set (a rate limiter's slot, see scheduler.py), each attempt
+    first waits for a slot; the deadline starts once it has one, so time
+    spent queued is neither a timeout nor a breaker failure. A hedged
+    duplicate waits for a slot of its own, within the attempt's deadline.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        timeout: float,
+        retries: int,
+        backoff: float,
+        hedge_after: Optional[float],
+        breaker: CircuitBreaker,
+        slot: Optional[Callable[[], AsyncContextManager[Any]]] = None,
+    ):
+        self.name = name
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.hedge_after = hedge_after
+        self.breaker = breaker
+        self.slot = slot
+        # metrics
+        self.calls = 0
+        self.failures = 0
+        self.timeouts = 0
+        self.retried = 0
+        self.hedged = 0
+        self.hedge_wins = 0
+        self.short_circuited = 0
+
+    async def call(
+        self,
+        fn: Callable[[], Awaitable[T]],
+        on_retry: Optional[Callable[[BaseException], Any]] = None,
+    ) -> T:
+        """Run fn() under the provider's policy; on_retry is called with the error before each retry"""
+        self.calls += 1
+        for attempt in range(self.retries + 1):
+            # the slot is released during the backoff below
+            async with self.slot() if self.slot is not None else nullcontext():
+                if not self.breaker.allow():
+                    self.short_circuited += 1
+                    raise CircuitOpenError(f"{self.name} circuit is open, failing fast")
+                try:
+                    result = await self._attempt(fn)
+                except asyncio.CancelledError:
+                    # the caller went away: let another call try the circuit
+                    self.breaker.release_trial()
+                    raise
+                except Exception as e:
+                    retryable = is_retryable(e)
+                    if is_provider_failure(e):
+                        self.breaker.record_failure()
+                    else:
+                        # the provider answered, so it is up
+                        self.breaker.record_success()
+                    if isinstance(e, asyncio.TimeoutError):
+                        self.timeouts += 1
+                    if not retryable or attempt == self.retries:
+                        self.failures += 1
+                        raise
+                    error = e
+                else:
+                    self.breaker.record_success()
+                    return result
+            self.retried += 1
+            delay = self.backoff * 2**attempt * random.uniform(0.5, 1.5)
+            logger.warning(
+                f"{self.name} call failed ({error!r}), retry {attempt + 1}/{self.retries} in {delay:.1f}s"
+            )
+            if on_retry is not None:
+                on_retry(error)
+            await asyncio.sleep(delay)
+
+    async def _attempt(self, fn: Callable[[], Awaitable[T]]) -> T:
+        if not self.hedge_after or self.hedge_after >= self.timeout:
+            return await asyncio.wait_for(fn(), self.timeout)
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.timeout
+        first = asyncio.ensure_future(fn())
+        tasks = {first}
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=self.hedge_after)
+            if not done:
+                self.hedged += 1
+                tasks.add(asyncio.ensure_future(self._hedge(fn)))
+            error: Optional[BaseException] = None
+            while tasks:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                done, tasks = await asyncio.wait(
+                    tasks, timeout=timeout, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    if task.exception() is None:
+                        if task is not first:
+                            self.hedge_wins += 1
+                        return task.result()
+                    error = task.exception()
+            if error is not None and not tasks:
+                raise error
+            raise asyncio.TimeoutError()
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def _hedge(self, fn: Callable[[], Awaitable[T]]) -> T:
+        # the duplicate is a provider call like any other: it needs its own slot and rate token
+        async with self.slot() if self.slot is not None else nullcontext():
+            return await fn()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "state": self.breaker.state,
+            "calls": self.calls,
+            "failures": self.failures,
+            "timeouts": self.timeouts,
+            "retries": self.retried,
+            "hedged": self.hedged,
+            "hedge_wins": self.hedge_wins,
+            "short_circuited": self.short_circuited,
+            "circuit_opened": self.breaker.opened,
+        }
+
+
+# provider -> env prefix and defaults: timeout, retries, backoff, hedge_after (0 = off)
+PROVIDERS = {
+    "search": ("SEARCH", 20.0, 2, 0.5, 0.0),
+    "llm": ("LLM", 180.0, 2, 1.0, 0.0),
+}
+
+_callers: Dict[str, ResilientCaller] = {}
+
+
+def get_caller(provider: str) -> ResilientCaller:
+    """Return the process-wide resilient caller for a provider ("search" or "llm")"""
+    caller = _callers.get(provider)
+    if caller is None:
+        prefix, timeout, retries, backoff, hedge_after = PROVIDERS[provider]
+        caller = ResilientCaller(
+            provider,
+            timeout=float(os.getenv(f"{prefix}_TIMEOUT", str(timeout))),
+            retries=int(os.getenv(f"{prefix}_RETRIES", str(retries))),
+            backoff=float(os.getenv(f"{prefix}_BACKOFF", str(backoff))),
+            hedge_after=float(os.getenv(f"{prefix}_HEDGE_AFTER", str(hedge_after))) or None,
+            breaker=CircuitBreaker(
+                failure_threshold=int(os.getenv(f"{prefix}_BREAKER_FAILURES", "5")),
+                reset_timeout=float(os.getenv(f"{prefix}_BREAKER_RESET", "30")),
+            ),
+            slot=get_limiter(provider).slot,
+        )
+        _callers[provider] = caller
+    return caller
+
+
+def resilience_stats() -> Dict[str, Dict[str, Any]]:
+    return {provider: get_caller(provider).stats() for provider in PROVIDERS}
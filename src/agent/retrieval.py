@@ -0,0 +1,156 @@
+import heapq
+import math
+import os
+import re
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from .dedup import STOPWORDS
+
+# target passage length in words; paragraphs are merged or split to get close to it
+PASSAGE_WORDS = int(os.getenv("PASSAGE_WORDS", "120"))
+# smallest share of a section's context given to a source that is included
+SOURCE_MIN_TOKENS = int(os.getenv("SOURCE_MIN_TOKENS", "200"))
+
+
+def terms(text: str) -> List[str]:
+    """Lowercased words of text, in any script, without stopwords, for lexical ranking"""
+    return [word for word in re.findall(r"\w+", text.lower()) if word not in STOPWORDS]
+
+
+def chunk_passages(text: str, words: int = PASSAGE_WORDS) -> List[str]:
+    """Split text into passages of about `words` words, along paragraph breaks when possible"""
+    passages = []
+    buffer: List[str] = []
+    for paragraph in re.split(r"\n\s*\n", text):
+        paragraph_words = paragraph.split()
+        if not paragraph_words:
+            continue
+        if len(buffer) + len(paragraph_words) > words and buffer:
+            passages.append(" ".join(buffer))
+            buffer = []
+        buffer.extend(paragraph_words)
+        while len(buffer) >= words:
+            passages.append(" ".join(buffer[:words]))
+            buffer = buffer[words:]
+    if buffer:
+        passages.append(" ".join(buffer))
+    return passages
+
+
+@dataclass
+class Passage:
+    source_id: int
+    position: int  # 0 is the search snippet, then the page passages in order
+    text: str
+    tokens: int
+
+
+class PassageIndex:
+    """Report-level BM25 inverted index over passages of the fetched pages.
+
+    Each source is chunked and indexed once, the first time a section finds
+    it; every section then retrieves its passages from the whole corpus
+    gathered for the report so far.
+    """
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.passages: List[Passage] = []
+        self._lengths: List[int] = []
+        self._total_length = 0
+        self._postings: Dict[str, List[Tuple[int, int]]] = defaultdict(list)
+        # sources whose snippet, and whose page passages, are indexed
+        self._snippets: set[int] = set()
+        self._pages: set[int] = set()
+
+    def add(self, source_id: int, snippet: str, snippet_tokens: int, raw_content: str = "", raw_tokens: int = 0):
+        """Index a source's snippet and page passages, unless they are already indexed.
+
+        A source first found by a search without page content gets its
+        passages indexed when a later search brings the page. Passage token
+        counts are estimated from the page's token count, pro rata to their
+        length, so the page is not tokenized again.
+        """
+        if source_id not in self._snippets:
+            self._snippets.add(source_id)
+            self._add_passage(Passage(source_id, 0, snippet, snippet_tokens))
+        if not raw_content or source_id in self._pages:
+            return
+        self._pages.add(source_id)
+        for position, text in enumerate(chunk_passages(raw_content), start=1):
+            tokens = math.ceil(raw_tokens * len(text) / len(raw_content))
+            self._add_passage(Passage(source_id, position, text, tokens))
+
+    def _add_passage(self, passage: Passage):
+        index = len(self.passages)
+        passage_terms = terms(passage.text)
+        frequencies: Dict[str, int] = defaultdict(int)
+        for term in passage_terms:
+            frequencies[term] += 1
+        for term, tf in frequencies.items():
+            self._postings[term].append((index, tf))
+        self.passages.append(passage)
+        self._lengths.append(len(passage_terms))
+        self._total_length += len(passage_terms)
+
+    def search(self, query: str, k: int) -> List[Tuple[float, Passage]]:
+        """Top k passages for query, best first"""
+        n = len(self.passages)
+        if not n:
+            return []
+        avg_length = self._total_length / n or 1.0
+        scores: Dict[int, float] = defaultdict(float)
+        for term in set(terms(query)):
+            postings = self._postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (n - len(postings) + 0.5) / (len(postings) + 0.5))
+            for index, tf in postings:
+                norm = self.k1 * (1 - self.b + self.b * self._lengths[index] / avg_length)
+                scores[index] += idf * tf * (self.k1 + 1) / (tf + norm)
+        best = heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+        return [(score, self.passages[index]) for index, score in best]
+
+    def unranked(self, k: int) -> List[Passage]:
+        """First k passages taking every source in turn: the snippets, then the pages in order"""
+        # sorted is stable, so sources keep the order they were indexed in
+        return sorted(self.passages, key=lambda passage: passage.position)[:k]
+
+    def __len__(self) -> int:
+        return len(self.passages)
+
+
+def allocate_budget(
+    scores: Sequence[float],
+    overheads: Sequence[int],
+    sizes: Sequence[int],
+    budget: int,
+    min_tokens: int = SOURCE_MIN_TOKENS,
+) -> List[Optional[int]]:
+    """Split a token budget between ranked sources.
+
+    Sources are visited from the best score down. Each one included costs its
+    overhead (title and URL) plus a share of what is left of the budget
+    proportional to its score, at least min_tokens and at most its size
+    (tokens of content available). A share a source cannot use goes to the
+    next ones. Returns the content tokens given to each source, None for
+    sources left out.
+    """
+    order = sorted(range(len(scores)), key=lambda i: scores[i], reverse=True)
+    allocation: List[Optional[int]] = [None] * len(scores)
+    remaining = budget
+    remaining_weight = sum(scores)
+    for i in order:
+        weight = scores[i]
+        remaining_weight -= weight
+        if remaining < overheads[i] + min(min_tokens, sizes[i]):
+            continue
+        remaining -= overheads[i]
+        share = remaining * weight / (remaining_weight + weight) if weight > 0 else 0
+        tokens = min(sizes[i], max(min_tokens, int(share)), remaining)
+        allocation[i] = tokens
+        remaining -= tokens
+    return allocation
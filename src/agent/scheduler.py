@@ -0,0 +1,117 @@
+import asyncio
+import os
+import time
+from contextlib import asynccontextmanager
+from logging import getLogger
+from typing import Dict
+
+from .metrics import QUEUE_WAIT
+
+logger = getLogger(__name__)
+
+
+class RateLimiter:
+    """Caps in-flight calls and request rate for one outbound provider.
+
+    Callers queue on the limiter instead of hitting the provider all at once,
+    so bursts are spread out rather than answered with 429s.
+    """
+
+    def __init__(self, name: str, max_in_flight: int, rps: float = 0):
+        self.name = name
+        self.max_in_flight = max_in_flight
+        self.rps = rps
+        self._semaphore = asyncio.Semaphore(max_in_flight)
+        # token bucket, refilled at `rps` tokens per second (disabled when rps <= 0)
+        self._bucket_lock = asyncio.Lock()
+        self._tokens = max(rps, 1.0)
+        self._last_refill = time.monotonic()
+        # metrics
+        self.queued = 0
+        self.in_flight = 0
+        self.completed = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    async def _take_token(self):
+        if self.rps <= 0:
+            return
+        async with self._bucket_lock:
+            while True:
+                now = time.monotonic()
+                capacity = max(self.rps, 1.0)
+                self._tokens = min(
+                    capacity, self._tokens + (now - self._last_refill) * self.rps
+                )
+                self._last_refill = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rps)
+
+    @asynccontextmanager
+    async def slot(self):
+        """Wait for a free slot and a rate token, then hold the slot for the call"""
+        start = time.monotonic()
+        self.queued += 1
+        try:
+            await self._semaphore.acquire()
+            try:
+                await self._take_token()
+            except BaseException:
+                self._semaphore.release()
+                raise
+        finally:
+            self.queued -= 1
+        wait = time.monotonic() - start
+        QUEUE_WAIT.observe(wait, provider=self.name)
+        self.total_wait += wait
+        self.max_wait = max(self.max_wait, wait)
+        self.in_flight += 1
+        try:
+            yield wait
+        finally:
+            self.in_flight -= 1
+            self.completed += 1
+            self._semaphore.release()
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "max_in_flight": self.max_in_flight,
+            "rps": self.rps,
+            "queued": self.queued,
+            "in_flight": self.in_flight,
+            "completed": self.completed,
+            "avg_wait_seconds": self.total_wait / self.completed if self.completed else 0.0,
+            "max_wait_seconds": self.max_wait,
+        }
+
+
+# provider -> (max in-flight env var, default, rps env var)
+PROVIDERS = {
+    "search": ("SEARCH_MAX_IN_FLIGHT", 16, "SEARCH_RPS"),
+    "llm": ("LLM_MAX_IN_FLIGHT", 8, "LLM_RPS"),
+}
+
+_limiters: Dict[str, RateLimiter] = {}
+
+
+def get_limiter(provider: str) -> RateLimiter:
+    """Return the process-wide limiter for a provider ("search" or "llm")"""
+    limiter = _limiters.get(provider)
+    if limiter is None:
+        max_env, max_default, rps_env = PROVIDERS[provider]
+        limiter = RateLimiter(
+            provider,
+            max_in_flight=int(os.getenv(max_env, str(max_default))),
+            rps=float(os.getenv(rps_env, "0")),
+        )
+        _limiters[provider] = limiter
+        logger.info(
+            f"Limiter {provider}: max_in_flight={limiter.max_in_flight}, rps={limiter.rps}"
+        )
+    return limiter
+
+
+def scheduler_stats() -> Dict[str, Dict[str, float]]:
+    return {provider: get_limiter(provider).stats() for provider in PROVIDERS}
@@ -1,10 +1,20 @@
 import asyncio
+import math
+import os
+import time
 from dataclasses import asdict, dataclass
+from functools import lru_cache
 from logging import getLogger
-from typing import Any, Dict, List, Union
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple, Union
+from urllib.parse import urlparse
 
 import tiktoken
-from langchain_community.utilities.tavily_search import TavilySearchAPIWrapper
+
+from .cache import SearchCache, close_search_cache, get_search_cache
+from .resilience import get_caller
+from .retrieval import Passage, PassageIndex, allocate_budget, terms
+from .sources import SourceStore, StoredSource
+from .tavily import close_search_client, get_search_client
 
 logger = getLogger(__name__)
 
@@ -16,23 +26,267 @@ class SearchQuery:
         return asdict(self)
 
 
+# Streaming searches (iter_search_results) stop waiting once this fraction of
+# the queries answered and the others had SEARCH_STRAGGLER_GRACE more seconds,
+# or after SEARCH_DEADLINE seconds in any case; the rest are cancelled
+SEARCH_ENOUGH_FRACTION = float(os.getenv("SEARCH_ENOUGH_FRACTION", "0.6"))
+SEARCH_STRAGGLER_GRACE = float(os.getenv("SEARCH_STRAGGLER_GRACE", "2"))
+SEARCH_DEADLINE = float(os.getenv("SEARCH_DEADLINE", "30"))
+
+# SEARCH_DEPTH=adaptive sends each section query as a cheap basic search without
+# page content first, and repeats it as an advanced search with page content
+# only when the basic results come from fewer than SEARCH_MIN_DOMAINS domains or
+# their snippets mention less than SEARCH_MIN_COVERAGE of the section's terms.
+# "basic" or "advanced" use that Tavily search depth for every query
+SEARCH_DEPTH = os.getenv("SEARCH_DEPTH", "adaptive")
+SEARCH_BASIC_RESULTS = int(os.getenv("SEARCH_BASIC_RESULTS", "5"))
+SEARCH_MIN_DOMAINS = int(os.getenv("SEARCH_MIN_DOMAINS", "3"))
+SEARCH_MIN_COVERAGE = float(os.getenv("SEARCH_MIN_COVERAGE", "0.5"))
+
+
+@dataclass
+class _InFlightSearch:
+    task: asyncio.Task
+    waiters: int = 0
+
+
+# identical searches already sent to Tavily, awaited by every caller asking for them
+_in_flight: Dict[str, _InFlightSearch] = {}
+_shared_searches = 0
+_cancelled_searches = 0
+# adaptive searches answered by the basic search, and escalated to advanced
+_basic_searches = 0
+_escalated_searches = 0
+
+
+def query_text(query: Any) -> str:
+    """Text of a query given as a string or an object with a search_query field.
+
+    LLM responses give searchtypes.SearchQuery models, which are not instances
+    of the dataclass above; str() of those would send "search_query='...'".
+    """
+    if isinstance(query, str):
+        return query
+    return str(getattr(query, "search_query", query))
+
+
+async def _fetch(tavily_search, key: str, query: str, **kwargs) -> Dict:
+    async def attempt() -> Dict:
+        return await tavily_search.raw_results_async(query=query, **kwargs)
+
+    # queued on the shared search limiter so bursts of queries don't trip rate
+    # limits, then deadline, retries and circuit breaker (see resilience.py)
+    result = await get_caller("search").call(attempt)
+    # kept in the cache with the result, so sections know how old their sources are
+    fetched_at = time.time()
+    for source in result.get("results", []):
+        if isinstance(source, dict):
+            source.setdefault("fetched_at", fetched_at)
+    cache = get_search_cache()
+    if cache is not None:
+        await cache.set(key, result)
+    return result
+
+
+def _fetched_before(search_response: Dict, timestamp: float) -> bool:
+    return any(
+        source.get("fetched_at") is None or source["fetched_at"] < timestamp
+        for source in search_response.get("results", [])
+        if isinstance(source, dict)
+    )
+
+
+async def _search(
+    tavily_search, query: str, fetched_after: Optional[float] = None, **kwargs
+) -> Dict:
+    """Search once for every concurrent caller, through the search cache.
+
+    Cached results with a page fetched before `fetched_after` are not used.
+    """
+    global _shared_searches
+    key = SearchCache.make_key(
+        query,
+        kwargs["max_results"],
+        kwargs["search_depth"],
+        kwargs["include_raw_content"],
+    )
+    cache = get_search_cache()
+    if cache is not None:
+        cached = await cache.get(key)
+        if cached is not None and not (
+            fetched_after is not None and _fetched_before(cached, fetched_after)
+        ):
+            return cached
+    search = _in_flight.get(key)
+    if search is None:
+        task = asyncio.create_task(_fetch(tavily_search, key, query, **kwargs))
+        search = _in_flight[key] = _InFlightSearch(task)
+        task.add_done_callback(lambda _: _in_flight.pop(key, None))
+    else:
+        _shared_searches += 1
+    search.waiters += 1
+    try:
+        # shielded so one caller going away does not cancel the search for the others
+        return await asyncio.shield(search.task)
+    finally:
+        search.waiters -= 1
+        if not search.waiters and not search.task.done():
+            # every caller gave up on this search
+            search.task.cancel()
+
+
+def search_stats() -> Dict[str, int]:
+    return {
+        "in_flight": len(_in_flight),
+        "shared": _shared_searches,
+        "cancelled": _cancelled_searches,
+        "basic": _basic_searches,
+        "escalated": _escalated_searches,
+    }
+
+
+def search_coverage(search_response: Union[Dict[str, Any], List[Any]], topic: str) -> Tuple[int, float]:
+    """Distinct domains of the results, and the fraction of the topic's terms their titles and snippets mention"""
+    results = [result for result in _flatten_results(search_response) if isinstance(result, dict)]
+    domains = {
+        urlparse(result["url"]).netloc.removeprefix("www.") for result in results if result.get("url")
+    }
+    topic_terms = set(terms(topic))
+    if not topic_terms:
+        return len(domains), 1.0
+    found = set()
+    for result in results:
+        found.update(terms(f"{result.get('title', '')} {result.get('content', '')}"))
+    return len(domains), len(topic_terms & found) / len(topic_terms)
+
+
+def _needs_escalation(search_response: Dict, query: str, topic: str) -> bool:
+    """Whether the basic results of an adaptive search cover topic too thinly (see SEARCH_DEPTH)"""
+    global _basic_searches, _escalated_searches
+    domains, coverage = search_coverage(search_response, topic)
+    if domains >= SEARCH_MIN_DOMAINS and coverage >= SEARCH_MIN_COVERAGE:
+        _basic_searches += 1
+        return False
+    _escalated_searches += 1
+    logger.info(
+        f"Escalating search '{query}' to advanced: {domains} domains, {coverage:.0%} coverage"
+    )
+    return True
+
+
+async def iter_search_results(
+    search_queries: List[Any],
+    num_results: int = 5,
+    include_raw_content: bool = False,
+    enough: float = SEARCH_ENOUGH_FRACTION,
+    grace: float = SEARCH_STRAGGLER_GRACE,
+    deadline: float = SEARCH_DEADLINE,
+    topic: Optional[str] = None,
+    depth: str = SEARCH_DEPTH,
+    fetched_after: Optional[float] = None,
+) -> AsyncIterator[Dict]:
+    """Run the searches concurrently and yield each result as soon as it arrives.
+
+    Once the `enough` fraction of the queries answered, the remaining ones get
+    `grace` more seconds; no search is awaited past `deadline` seconds. The
+    searches still running then are cancelled, so a slow query does not hold
+    up the caller. With depth "adaptive" and a topic, each query is sent as a
+    basic search, whose results are yielded right away; when they cover the
+    topic too thinly, the query is sent again for num_results advanced
+    results with page content, yielded as well (see SEARCH_DEPTH). Those
+    escalations do not count toward `enough` and are not cut by the grace
+    period, only by `deadline`. Cached results with pages fetched before
+    `fetched_after` are searched again.
+    """
+    global _cancelled_searches
+    tavily_search = get_search_client()
+    adaptive = depth == "adaptive" and topic is not None
+
+    def search(query: str, search_depth: str, max_results: int, raw_content: bool):
+        return asyncio.ensure_future(
+            _search(
+                tavily_search,
+                query=query,
+                fetched_after=fetched_after,
+                max_results=max_results,
+                search_depth=search_depth,
+                include_answer=False,
+                include_raw_content=raw_content,
+            )
+        )
+
+    # first search of each query, mapped to the query; escalated searches are kept apart
+    pending: Dict[asyncio.Future, str] = {}
+    for query in map(query_text, search_queries):
+        if adaptive:
+            pending[search(query, "basic", SEARCH_BASIC_RESULTS, False)] = query
+        else:
+            advanced = "advanced" if depth == "adaptive" else depth
+            pending[search(query, advanced, num_results, include_raw_content)] = query
+    escalations: set[asyncio.Future] = set()
+    needed = math.ceil(len(pending) * enough)
+    loop = asyncio.get_running_loop()
+    end = loop.time() + deadline
+    cutoff = end
+    answered = 0
+    cancelled = 0
+    try:
+        while pending or escalations:
+            now = loop.time()
+            if pending and now >= cutoff:
+                # stragglers; escalations keep running until the deadline
+                for task in pending:
+                    task.cancel()
+                cancelled += len(pending)
+                pending = {}
+                continue
+            if now >= end:
+                break
+            done, _ = await asyncio.wait(
+                set(pending) | escalations,
+                timeout=(cutoff if pending else end) - now,
+                return_when=asyncio.FIRST_COMPLETED,
+            )
+            for task in done:
+                query = pending.pop(task, None)
+                if query is not None:
+                    answered += 1
+                else:
+                    escalations.discard(task)
+                if task.cancelled():
+                    continue
+                if task.exception() is not None:
+                    logger.error(f"Error during search queries: {task.exception()}")
+                    continue
+                result = task.result()
+                if query is not None and adaptive and _needs_escalation(result, query, topic):
+                    escalations.add(search(query, "advanced", num_results, True))
+                yield result
+            if answered >= needed:
+                cutoff = min(cutoff, loop.time() + grace)
+    finally:
+        for task in [*pending, *escalations]:
+            task.cancel()
+        cancelled += len(pending) + len(escalations)
+        if cancelled:
+            _cancelled_searches += cancelled
+            logger.info(f"Cancelled {cancelled} straggling searches")
+
+
 async def run_search_queries(
     search_queries: List[Union[str, SearchQuery]],
     num_results: int = 5,
     include_raw_content: bool = False
 ) -> List[Dict]:
-    tavily_search = TavilySearchAPIWrapper()
+    tavily_search = get_search_client()
     search_tasks = []
     for query in search_queries:
-        # Handle both string and SearchQuery objects
-        # Just in case LLM fails to generate queries as:
-        # class SearchQuery(BaseModel):
-        #     search_query: str
-        query_str = query.search_query if isinstance(query, SearchQuery) else str(query) # text query
+        query_str = query_text(query)
         try:
             # get results from tavily async (in parallel) for each search query
             search_tasks.append(
-                tavily_search.raw_results_async(
+                _search(
+                    tavily_search,
                     query=query_str,
                     max_results=num_results,
                     search_depth='advanced',
@@ -60,12 +314,52 @@ async def run_search_queries(
         logger.error(f"Error during search queries: {e}")
         return []
 
-def format_search_query_results(
-    search_response: Union[Dict[str, Any], List[Any]],
-    max_tokens: int = 2000,
-    include_raw_content: bool = False
-) -> str:
-    encoding = tiktoken.encoding_for_model("gpt-4")
+# Search context given to each section writer: at most SECTION_PASSAGES of the
+# passages retrieved from the report's pages, within SECTION_CONTEXT_TOKENS
+# tokens; the first SOURCE_MAX_TOKENS tokens of each page are indexed
+SECTION_CONTEXT_TOKENS = int(os.getenv("SECTION_CONTEXT_TOKENS", "16000"))
+SECTION_PASSAGES = int(os.getenv("SECTION_PASSAGES", "40"))
+SOURCE_MAX_TOKENS = int(os.getenv("SOURCE_MAX_TOKENS", "4000"))
+
+# Generous chars-per-token estimate for the first prefix we tokenize; English
+# text averages ~4 characters per token with the gpt-4 encoding
+CHARS_PER_TOKEN_ESTIMATE = 6
+# Extra tokens the prefix must hold past max_tokens, so that cutting the text
+# cannot change any of the tokens we keep
+TRUNCATION_TOKEN_MARGIN = 64
+
+
+@lru_cache(maxsize=1)
+def get_encoding() -> tiktoken.Encoding:
+    """Load the tokenizer once per process"""
+    return tiktoken.encoding_for_model("gpt-4")
+
+
+def truncate_tokens(text: str, max_tokens: int) -> Tuple[str, int]:
+    """Truncate text to its first max_tokens tokens, returning the text and its token count.
+
+    Only a bounded prefix of the text is tokenized: we start from a character
+    budget estimated from max_tokens, cut it at a space so no word is split,
+    and double the budget until the prefix holds enough tokens.
+    """
+    if max_tokens <= 0:
+        return "", 0
+    encoding = get_encoding()
+    budget = max_tokens * CHARS_PER_TOKEN_ESTIMATE
+    while True:
+        if len(text) <= budget:
+            tokens = encoding.encode(text)
+            break
+        cut = text.rfind(" ", 0, budget)
+        tokens = encoding.encode(text[: cut if cut > 0 else budget])
+        if len(tokens) > max_tokens + TRUNCATION_TOKEN_MARGIN:
+            break
+        budget *= 2
+    truncated_tokens = tokens[:max_tokens]
+    return encoding.decode(truncated_tokens), len(truncated_tokens)
+
+
+def _flatten_results(search_response: Union[Dict[str, Any], List[Any]]) -> List[Dict]:
     sources_list = []
 
     # Handle different response formats if search results is a dict
@@ -84,41 +378,184 @@ def format_search_query_results(
                     sources_list.append(response)
             elif isinstance(response, list):
                 sources_list.extend(response)
+    return sources_list
 
-    if not sources_list:
-        return "No search results found."
 
+def _unique_sources(
+    sources_list: List[Any],
+    source_store: SourceStore,
+    max_tokens: Optional[int],
+) -> Dict[str, StoredSource]:
     # Deduplicate by URL and keep unique sources (website urls)
     unique_sources = {}
     for source in sources_list:
         if isinstance(source, dict) and 'url' in source:
             if source['url'] not in unique_sources:
-                unique_sources[source['url']] = source
+                unique_sources[source['url']] = source_store.add(
+                    source,
+                    # truncate raw webpage content to a certain number of tokens to prevent exceeding LLM max token window
+                    max_tokens=max_tokens,
+                    truncate=truncate_tokens,
+                )
+    return unique_sources
+
 
-    # Format output
-    formatted_text = "Content from web search:\n\n"
-    for i, source in enumerate(unique_sources.values(), 1):
-        formatted_text += f"Source {source.get('title', 'Untitled')}:\n===\n"
-        formatted_text += f"URL: {source['url']}\n===\n"
-        formatted_text += f"Most relevant content from source: {source.get('content', 'No content available')}\n===\n"
+def _source_title(source: StoredSource) -> str:
+    return f"Source [{source.id}] {source.title}:\n===\nURL: {source.url}\n===\n"
+
+
+def _source_header(source: StoredSource) -> str:
+    return (
+        f"{_source_title(source)}"
+        f"Most relevant content from source: {source.content}\n===\n"
+    )
+
+
+def format_search_query_results(
+    search_response: Union[Dict[str, Any], List[Any]],
+    max_tokens: int = 2000,
+    include_raw_content: bool = False,
+    source_store: Optional[SourceStore] = None,
+) -> str:
+    sources_list = _flatten_results(search_response)
+    if not sources_list:
+        return "No search results found."
+
+    # Sources are shared across the sections of a report, so each page
+    # is truncated and tokenized once and keeps the same id
+    if source_store is None:
+        source_store = SourceStore()
+    unique_sources = _unique_sources(
+        sources_list, source_store, max_tokens if include_raw_content else None
+    )
+
+    # Format output, collecting parts and joining once instead of growing a string
+    parts = ["Content from web search:\n\n"]
+    for source in unique_sources.values():
+        parts.append(_source_header(source))
 
         if include_raw_content:
-            # truncate raw webpage content to a certain number of tokens to prevent exceeding LLM max token window
-            raw_content = source.get("raw_content", "")
+            raw_content = source.raw_content.get(max_tokens)
             if raw_content:
-                tokens = encoding.encode(raw_content)
-                truncated_tokens = tokens[:max_tokens]
-                truncated_content = encoding.decode(truncated_tokens)
-                formatted_text += f"Raw Content: {truncated_content}\n\n"
+                parts.append(f"Raw Content: {raw_content}\n\n")
+
+    return "".join(parts).strip()
+
+
+def index_search_results(
+    search_response: Union[Dict[str, Any], List[Any]],
+    source_store: SourceStore,
+    index: PassageIndex,
+    max_tokens: int = SOURCE_MAX_TOKENS,
+):
+    """Add search results to the report's sources and passage index.
+
+    Pages are truncated to max_tokens and indexed once per report, snippet
+    plus passages (see retrieval.PassageIndex).
+    """
+    encoding = get_encoding()
+    for source in _unique_sources(_flatten_results(search_response), source_store, max_tokens).values():
+        index.add(
+            source.id,
+            source.content,
+            len(encoding.encode(source.content)),
+            source.raw_content.get(max_tokens, ""),
+            source.raw_tokens.get(max_tokens, 0),
+        )
+
+
+def pack_passages(
+    query: str,
+    source_store: SourceStore,
+    index: PassageIndex,
+    budget: int = SECTION_CONTEXT_TOKENS,
+) -> Tuple[str, int, List[StoredSource]]:
+    """Format the passages of the report most relevant to query.
+
+    The best SECTION_PASSAGES passages are grouped by source, and budget
+    tokens are split between the sources by the score of their best
+    passage (see retrieval.allocate_budget), so a long page matching
+    throughout cannot crowd out the others. Each source fills its share
+    with its best passages, then passages left out are added best first
+    while they fit in what remains. When no passage matches the query,
+    sources share the budget equally, from their snippet and first passages.
+    A source's title and URL are counted once. Passages are grouped by
+    source in page order. Returns the text, its estimated token count and
+    the sources it quotes.
+    """
+    encoding = get_encoding()
+    candidates: Dict[int, List[Passage]] = {}
+    scores: Dict[int, float] = {}
+    ranked = index.search(query, k=SECTION_PASSAGES)
+    if not ranked:
+        # nothing to rank by (no query terms, or none in the pages): keep the
+        # pages as they came, rather than writing the section without sources
+        ranked = [(1.0, passage) for passage in index.unranked(SECTION_PASSAGES)]
+    for score, passage in ranked:
+        candidates.setdefault(passage.source_id, []).append(passage)
+        # results come best first, so this is the source's best passage score
+        scores.setdefault(passage.source_id, score)
+    source_ids = list(candidates)
+    overheads = []
+    for source_id in source_ids:
+        source = source_store.by_id(source_id)
+        if source.header_tokens is None:
+            source.header_tokens = len(encoding.encode(_source_title(source)))
+        overheads.append(source.header_tokens)
+    allocation = allocate_budget(
+        [scores[source_id] for source_id in source_ids],
+        overheads,
+        [sum(passage.tokens for passage in candidates[source_id]) for source_id in source_ids],
+        budget,
+    )
+
+    selected: Dict[int, List[Passage]] = {}
+    total = 0
+
+    def take(passage: Passage, limit: int):
+        nonlocal total
+        source_id = passage.source_id
+        cost = passage.tokens
+        if source_id not in selected:
+            cost += source_store.by_id(source_id).header_tokens
+        if total + cost <= limit:
+            selected.setdefault(source_id, []).append(passage)
+            total += cost
+
+    # each source's share, best passages first
+    for source_id, overhead, tokens in zip(source_ids, overheads, allocation):
+        if tokens is None:
+            continue
+        limit = total + overhead + tokens
+        for passage in candidates[source_id]:
+            take(passage, limit)
+    # shares a source could not fill with whole passages go to the best passages left out
+    kept = {id(passage) for passages in selected.values() for passage in passages}
+    for _, passage in ranked:
+        if id(passage) not in kept:
+            take(passage, budget)
+    if not selected:
+        return "No search results found.", 0, []
 
+    parts = ["Content from web search:\n\n"]
+    for source_id, passages in selected.items():
+        parts.append(_source_title(source_store.by_id(source_id)))
+        passages.sort(key=lambda passage: passage.position)
+        parts.append(
+            "Most relevant content from source: "
+            + "\n...\n".join(passage.text for passage in passages)
+            + "\n===\n\n"
+        )
+    return "".join(parts).strip(), total, [source_store.by_id(source_id) for source_id in selected]
 
-    return formatted_text.strip()
 
 async def main():
     docs = await run_search_queries(['langgraph'], include_raw_content=True)
     output = format_search_query_results(docs, max_tokens=500,
     include_raw_content=True)
     print(output)
+    await close_search_client()
+    close_search_cache()
 
 if __name__ == "__main__":
     asyncio.run(main())
\ No newline at end of file
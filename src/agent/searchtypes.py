@@ -1,10 +1,18 @@
 import operator
-from typing import Annotated, List
+from typing import Annotated, List, Optional
 
 from pydantic import BaseModel, Field
-from typing_extensions import TypedDict
+from pydantic.json_schema import SkipJsonSchema
+from typing_extensions import NotRequired, TypedDict
 
 
+# a web page a section was written from, and when it was fetched
+class SectionSource(BaseModel):
+    url: str
+    fetched_at: Optional[float] = Field(
+        None, description="Unix time the page was fetched from the search API."
+    )
+
 # defines structure for each section in the report
 class Section(BaseModel):
     name: str = Field(
@@ -19,6 +27,15 @@ class Section(BaseModel):
     content: str = Field(
         description="The content for this section."
     )
+    depends_on: List[str] = Field(
+        default_factory=list,
+        description="For sections without research: names of the research sections this section draws on. Empty means all of them.",
+    )
+    # set by the section writers, and left out of the schema the planner fills in
+    sources: SkipJsonSchema[List[SectionSource]] = Field(
+        default_factory=list,
+        description="The web pages the section is written from.",
+    )
 
 class Sections(BaseModel):
     sections: List[Section] = Field(
@@ -37,24 +54,29 @@ class Queries(BaseModel):
 # consists of input topic and output report generated
 class ReportStateInput(TypedDict):
     topic: str # Report topic
+    sections: NotRequired[list[Section]] # Plan of a previous report, for a refresh
+    reuse: NotRequired[list[str]] # Sections of that report kept as they are
 
 class ReportStateOutput(TypedDict):
     final_report: str # Final report
+    sections: list[Section] # Sections with their content and sources, to refresh the report later
 
 # overall agent state which will be passed and updated in nodes in the graph
 class ReportState(TypedDict):
     topic: str # Report topic
     sections: list[Section] # List of report sections
+    reuse: list[str] # Sections carried over from a previous report by a refresh
     completed_sections: Annotated[list, operator.add] # Send() API
-    report_sections_from_research: str # completed sections to write final sections
     final_report: str # Final report
 
 # defines the key structure for sections written using the agent
 class SectionState(TypedDict):
     section: Section # Report section
+    section_index: int # Position of the section in the report
     search_queries: list[SearchQuery] # List of search queries
-    source_str: str # String of formatted source content from web search
-    report_sections_from_research: str # completed sections to write final sections
+    source_ref: str # Handle of the section's search context in the report's BlobStore
+    sources: list[SectionSource] # Pages the search context was packed from
+    depends_on: list[str] # research sections a final section waits for
     completed_sections: list[Section] # Final key in outer state for Send() API
 
 class SectionOutputState(TypedDict):
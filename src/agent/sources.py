@@ -0,0 +1,72 @@
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional
+
+
+@dataclass
+class StoredSource:
+    id: int
+    url: str
+    title: str
+    content: str
+    # raw page content truncated once per token budget, with its token count
+    raw_content: Dict[int, str] = field(default_factory=dict)
+    raw_tokens: Dict[int, int] = field(default_factory=dict)
+    # tokens of the title and URL block, counted on first use
+    header_tokens: Optional[int] = None
+    # unix time the search API returned the page
+    fetched_at: Optional[float] = None
+
+
+class SourceStore:
+    """Report-scoped store of web sources keyed by URL.
+
+    Every section of a report adds its search results here, so a page that
+    shows up in several sections is truncated and tokenized only once and
+    keeps the same id across the whole report.
+    """
+
+    def __init__(self):
+        self._by_url: Dict[str, StoredSource] = {}
+        self._by_id: Dict[int, StoredSource] = {}
+
+    def add(
+        self,
+        source: Dict[str, Any],
+        max_tokens: Optional[int] = None,
+        truncate: Optional[Callable[[str, int], tuple[str, int]]] = None,
+    ) -> StoredSource:
+        url = source["url"]
+        stored = self._by_url.get(url)
+        if stored is None:
+            stored = StoredSource(
+                id=len(self._by_url) + 1,
+                url=url,
+                title=source.get("title", "Untitled"),
+                content=source.get("content", "No content available"),
+                fetched_at=source.get("fetched_at"),
+            )
+            self._by_url[url] = stored
+            self._by_id[stored.id] = stored
+        raw_content = source.get("raw_content")
+        if (
+            raw_content
+            and max_tokens is not None
+            and truncate is not None
+            and max_tokens not in stored.raw_content
+        ):
+            text, tokens = truncate(raw_content, max_tokens)
+            stored.raw_content[max_tokens] = text
+            stored.raw_tokens[max_tokens] = tokens
+        return stored
+
+    def get(self, url: str) -> Optional[StoredSource]:
+        return self._by_url.get(url)
+
+    def by_id(self, source_id: int) -> StoredSource:
+        return self._by_id[source_id]
+
+    def all(self) -> List[StoredSource]:
+        return list(self._by_url.values())
+
+    def __len__(self) -> int:
+        return len(self._by_url)
@@ -0,0 +1,128 @@
+import json
+import os
+from logging import getLogger
+from typing import Any, Dict, Optional
+
+import aiohttp
+
+from .metrics import SEARCH_RESULT_BYTES
+
+logger = getLogger(__name__)
+
+TAVILY_API_URL = "https://api.tavily.com"
+
+
+class SearchError(Exception):
+    """Non-200 answer from the search API"""
+
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+class TavilyClient:
+    """Tavily search client sharing one keep-alive connection pool for the whole process.
+
+    Mirrors TavilySearchAPIWrapper.raw_results_async, but reuses warm HTTP
+    connections instead of opening a new aiohttp session for every query.
+    """
+
+    def __init__(
+        self,
+        api_key: Optional[str] = None,
+        base_url: str = TAVILY_API_URL,
+        max_connections: int = 20,
+        keepalive_timeout: float = 30.0,
+        timeout: float = 120.0,
+    ):
+        self.api_key = api_key or os.getenv("TAVILY_API_KEY", "")
+        self.base_url = base_url.rstrip("/")
+        self.max_connections = max_connections
+        self.keepalive_timeout = keepalive_timeout
+        self.timeout = timeout
+        # number of TCP connections opened since the client started
+        self.connections_created = 0
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    async def _on_connection_create_end(self, session, context, params):
+        self.connections_created += 1
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            trace_config = aiohttp.TraceConfig()
+            trace_config.on_connection_create_end.append(self._on_connection_create_end)
+            connector = aiohttp.TCPConnector(
+                limit=self.max_connections,
+                keepalive_timeout=self.keepalive_timeout,
+            )
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+                trace_configs=[trace_config],
+            )
+        return self._session
+
+    async def start(self):
+        self._get_session()
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    async def raw_results_async(
+        self,
+        query: str,
+        max_results: int = 5,
+        search_depth: str = "advanced",
+        include_answer: bool = False,
+        include_raw_content: bool = False,
+    ) -> Dict[str, Any]:
+        params = {
+            "api_key": self.api_key,
+            "query": query,
+            "max_results": max_results,
+            "search_depth": search_depth,
+            "include_answer": include_answer,
+            "include_raw_content": include_raw_content,
+            "include_images": False,
+        }
+        session = self._get_session()
+        async with session.post(f"{self.base_url}/search", json=params) as res:
+            if res.status != 200:
+                raise SearchError(res.status, f"Error {res.status}: {res.reason}")
+            body = await res.read()
+            SEARCH_RESULT_BYTES.inc(len(body))
+            return json.loads(body)
+
+
+_search_client: Optional[TavilyClient] = None
+
+
+def get_search_client() -> TavilyClient:
+    """Return the process-wide search client, creating it on first use"""
+    global _search_client
+    if _search_client is None:
+        _search_client = TavilyClient(
+            base_url=os.getenv("TAVILY_API_URL", TAVILY_API_URL),
+            max_connections=int(os.getenv("TAVILY_MAX_CONNECTIONS", "20")),
+            keepalive_timeout=float(os.getenv("TAVILY_KEEPALIVE_TIMEOUT", "30")),
+        )
+    return _search_client
+
+
+async def init_search_client() -> TavilyClient:
+    client = get_search_client()
+    await client.start()
+    logger.info(f"Search client ready, max_connections={client.max_connections}")
+    return client
+
+
+async def close_search_client():
+    global _search_client
+    if _search_client is not None:
+        logger.info(
+            f"Closing search client, connections_created={_search_client.connections_created}"
+        )
+        await _search_client.close()
+        _search_client = None
@@ -2,6 +2,8 @@ import logging
 from asyncio import StreamWriter
 from logging import getLogger
 
+from .searchtypes import Section
+
 logger = getLogger(__name__)
 
 
@@ -14,3 +16,23 @@ def log_event(writer: StreamWriter, log: str, level: int = logging.INFO):
             "level": logging.getLevelName(level),
         }
     )
+
+
+def escape_dollars(text: str) -> str:
+    """Escape every $ that is not already preceded by a backslash"""
+    # unescape first so already escaped \$ are not escaped twice
+    return text.replace("\\$", "$").replace("$", "\\$")
+
+
+def section_payload(section: Section, index: int) -> dict:
+    return {
+        "event": "section",
+        "name": section.name,
+        "index": index,
+        "content": escape_dollars(section.content),
+    }
+
+
+def section_event(writer: StreamWriter, section: Section, index: int):
+    """Stream a finished section to the client as soon as it is written"""
+    writer(section_payload(section, index))
@@ -1,29 +1,57 @@
 from langgraph.config import get_stream_writer
 from langgraph.constants import Send
 
+from .metrics import instrument_node
 from .searchtypes import ReportState, Section
-from .utils import log_event
+from .utils import escape_dollars, log_event
+
+
+def final_section_dependencies(section: Section, sections: list[Section]) -> list[str]:
+    """Names of the research sections a final section waits for: its depends_on, or all of them"""
+    research = [s.name for s in sections if s.research]
+    wanted = set(section.depends_on) & set(research)
+    return [name for name in research if name in wanted] if wanted else research
 
 
 def parallelize_section_writing(state: ReportState):
-    """This is the "map" step when we kick off web research for some sections of the report in parallel and then write the section"""
+    """This is the "map" step when we kick off web research for some sections of the report in parallel and then write the section.
 
-    # Kick off section writing in parallel via Send() API for any sections that require research
-    return [
+    Final sections are started in the same step: each one waits for the
+    research sections it depends on (see write_final_sections), so it can be
+    written as soon as those are done instead of after every research section.
+    Sections reused by a refresh are not written again.
+    """
+    sections = state["sections"]
+    reuse = set(state.get("reuse", []))
+    sends = [
+        # Kick off section writing in parallel via Send() API for any sections that require research
         Send(
             "section_builder_with_web_search",  # name of the subagent node
-            {"section": s},
+            {"section": s, "section_index": i},
         )
-        for s in state["sections"]
         if s.research
+        else Send(
+            "write_final_sections",
+            {
+                "section": s,
+                "section_index": i,
+                "depends_on": final_section_dependencies(s, sections),
+            },
+        )
+        for i, s in enumerate(sections)
+        if s.name not in reuse
     ]
+    if not sends and sections:
+        # a refresh with nothing stale goes straight to the report
+        return ["compile_final_report"]
+    # no sections at all (the plan failed): end without a report
+    return sends
 
 
 def format_sections(sections: list[Section]) -> str:
     """Format a list of report sections into a single text string"""
-    formatted_str = ""
-    for idx, section in enumerate(sections, 1):
-        formatted_str += f"""
+    return "".join(
+        f"""
 {"=" * 60}
 Section {idx}: {section.name}
 {"=" * 60}
@@ -36,62 +64,29 @@ Content:
 {section.content if section.content else "[Not yet written]"}
 
 """
-    return formatted_str
-
-
-def format_completed_sections(state: ReportState):
-    """Gather completed sections from research and format them as context for writing the final sections"""
-    writer = get_stream_writer()
-    log_event(writer, "--- Formatting Completed Sections ---")
-    # List of completed sections
-    completed_sections = state["completed_sections"]
-    # Format completed section to str to use as context for final sections
-    completed_report_sections = format_sections(completed_sections)
-
-    log_event(writer, "--- Formatting Completed Sections is Done ---")
-    return {"report_sections_from_research": completed_report_sections}
+        for idx, section in enumerate(sections, 1)
+    )
 
 
+@instrument_node
 def compile_final_report(state: ReportState):
     """Compile the final report"""
     writer = get_stream_writer()
     # Get sections
     sections = state["sections"]
-    completed_sections = {s.name: s.content for s in state["completed_sections"]}
+    completed_sections = {s.name: s for s in state["completed_sections"]}
 
     log_event(writer, "--- Compiling Final Report ---")
     # Update sections with completed content while maintaining original order
     for section in sections:
-        section.content = completed_sections[section.name]
+        section.content = completed_sections[section.name].content
+        section.sources = completed_sections[section.name].sources
 
     # Compile final report
     all_sections = "\n\n".join([s.content for s in sections])
     # Escape unescaped $ symbols to display properly in Markdown
-    formatted_sections = all_sections.replace(
-        "\\$", "TEMP_PLACEHOLDER"
-    )  # Temporarily mark already escaped $
-    formatted_sections = formatted_sections.replace("$", "\\$")  # Escape all $
-    formatted_sections = formatted_sections.replace(
-        "TEMP_PLACEHOLDER", "\\$"
-    )  # Restore originally escaped $
+    formatted_sections = escape_dollars(all_sections)
 
     # Now escaped_sections contains the properly escaped Markdown text
     log_event(writer, "--- Compiling Final Report Done ---")
-    return {"final_report": formatted_sections}
-
-
-def parallelize_final_section_writing(state: ReportState):
-    """Write any final sections using the Send API to parallelize the process"""
-
-    # Kick off section writing in parallel via Send() API for any sections that do not require research
-    return [
-        Send(
-            "write_final_sections",
-            {
-                "section": s,
-                "report_sections_from_research": state["report_sections_from_research"],
-            },
-        )
-        for s in state["sections"]
-        if not s.research
-    ]
+    return {"final_report": formatted_sections, "sections": sections}
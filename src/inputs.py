@@ -1,7 +1,15 @@
-from pydantic import BaseModel
+from typing import List
+
+from pydantic import BaseModel, Field
 
 
 class DeepSearchInput(BaseModel):
     inputs: str
     recursion_limit: int = 50
-    report_plan_depth: int = 8
\ No newline at end of file
+    report_plan_depth: int = 8
+    stream_tokens: bool = False
+    # skip the report cache lookup; the new report still replaces the cached one
+    no_cache: bool = False
+
+class BatchInput(BaseModel):
+    items: List[DeepSearchInput] = Field(min_length=1)
@@ -1,3 +1,4 @@
+import asyncio
 import os
 from contextlib import asynccontextmanager
 from logging import getLogger
@@ -5,7 +6,14 @@ from logging import getLogger
 from fastapi import FastAPI
 from opentelemetry.instrumentation.fastapi import FastAPIInstrumentor
 
+from .agent import use_checkpointer
+from .agent.cache import close_search_cache
+from .agent.checkpoint import close_checkpointer, init_checkpointer
+from .agent.models import init_models
+from .agent.search import get_encoding
+from .agent.tavily import close_search_client, init_search_client
 from .server.error import init_error_handlers
+from .server.jobs import start_job_manager, stop_job_manager
 from .server.middleware import init_middleware
 from .server.router import router
 
@@ -15,8 +23,19 @@ logger = getLogger(__name__)
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     logger.info(f"Server running on port {os.getenv('PORT', 80)}")
+    await init_search_client()
+    # load the tokenizer before the first request needs it
+    await asyncio.to_thread(get_encoding)
+    use_checkpointer(await init_checkpointer())
+    await init_models()
+    start_job_manager()
     yield
     logger.info("Server shutting down")
+    await stop_job_manager()
+    await close_search_client()
+    close_search_cache()
+    use_checkpointer(None)
+    await close_checkpointer()
 
 
 app = FastAPI(lifespan=lifespan)
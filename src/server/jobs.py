@@ -0,0 +1,180 @@
+import asyncio
+import logging
+import os
+import time
+from abc import ABC, abstractmethod
+from typing import List, Optional
+from uuid import uuid4
+
+from pydantic import BaseModel, Field
+
+from ..agent import stream_events
+from ..agent.cache import TTLCache
+from ..inputs import DeepSearchInput
+
+logger = logging.getLogger(__name__)
+
+
+class JobSection(BaseModel):
+    index: int
+    name: str
+    content: str
+
+
+class Job(BaseModel):
+    id: str
+    status: str = "queued"  # queued, running, completed or failed
+    request: DeepSearchInput
+    created_at: float = Field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    sections: List[JobSection] = Field(default_factory=list)
+    report: Optional[str] = None
+    error: Optional[str] = None
+
+    def summary(self) -> dict:
+        """Job status with the sections written so far, without the final report"""
+        return self.model_dump(exclude={"report", "request"}) | {
+            "sections": [s.model_dump() for s in sorted(self.sections, key=lambda s: s.index)],
+            "has_report": self.report is not None,
+        }
+
+
+class ResultStore(ABC):
+    """Where jobs are kept while they run and after they finish.
+
+    Subclass it to keep results outside the process (database, object storage...).
+    """
+
+    @abstractmethod
+    async def save(self, job: Job):
+        ...
+
+    @abstractmethod
+    async def get(self, job_id: str) -> Optional[Job]:
+        ...
+
+
+class MemoryResultStore(ResultStore):
+    """In-process store, bounded in size and expiring jobs after ttl seconds"""
+
+    def __init__(self, max_size: int, ttl: float):
+        self._jobs = TTLCache(max_size, ttl)
+
+    async def save(self, job: Job):
+        self._jobs.set(job.id, job)
+
+    async def get(self, job_id: str) -> Optional[Job]:
+        return self._jobs.get(job_id)
+
+
+class QueueFullError(Exception):
+    pass
+
+
+class JobManager:
+    """In-process queue of report jobs run by a bounded pool of workers"""
+
+    def __init__(self, store: ResultStore, workers: int, queue_size: int):
+        self.store = store
+        self.workers = workers
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self._tasks: List[asyncio.Task] = []
+
+    def start(self):
+        self._tasks = [
+            asyncio.create_task(self._worker(), name=f"job-worker-{i}")
+            for i in range(self.workers)
+        ]
+        logger.info(f"Job workers started: {self.workers}")
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def submit(self, request: DeepSearchInput) -> Job:
+        # the job id doubles as the run id, so an interrupted job can be resumed
+        job = Job(id=uuid4().hex, request=request)
+        if self._queue.full():
+            raise QueueFullError("Job queue is full, retry later")
+        # saved before a worker can see it, so the queued status never overwrites a later one
+        await self.store.save(job)
+        try:
+            self._queue.put_nowait(job)
+        except asyncio.QueueFull:
+            # filled up while the job was being saved
+            job.status = "failed"
+            job.error = "Job queue is full, retry later"
+            job.finished_at = time.time()
+            await self.store.save(job)
+            raise QueueFullError(job.error)
+        return job
+
+    def stats(self) -> dict:
+        return {"workers": self.workers, "queued": self._queue.qsize()}
+
+    async def _worker(self):
+        while True:
+            job = await self._queue.get()
+            try:
+                await self._run(job)
+            finally:
+                self._queue.task_done()
+
+    async def _run(self, job: Job):
+        job.status = "running"
+        job.started_at = time.time()
+        await self.store.save(job)
+        try:
+            async for event in stream_events(job.request, job.id):
+                if event["event"] == "section":
+                    job.sections.append(
+                        JobSection(
+                            index=event["index"],
+                            name=event["name"],
+                            content=event["content"],
+                        )
+                    )
+                    await self.store.save(job)
+                elif event["event"] == "final":
+                    job.report = event["report"]
+                elif event["event"] == "error":
+                    job.error = event["message"]
+            job.status = "completed" if job.report is not None else "failed"
+        except Exception as e:
+            logger.error(f"Error during job {job.id}: {e}", exc_info=e)
+            job.status = "failed"
+            job.error = str(e)
+        finally:
+            job.finished_at = time.time()
+            await self.store.save(job)
+
+
+_job_manager: Optional[JobManager] = None
+
+
+def get_job_manager() -> JobManager:
+    global _job_manager
+    if _job_manager is None:
+        _job_manager = JobManager(
+            store=MemoryResultStore(
+                max_size=int(os.getenv("JOB_RESULTS_MAX", "1000")),
+                ttl=float(os.getenv("JOB_RESULTS_TTL", "86400")),
+            ),
+            workers=int(os.getenv("JOB_WORKERS", "4")),
+            queue_size=int(os.getenv("JOB_QUEUE_SIZE", "100")),
+        )
+    return _job_manager
+
+
+def start_job_manager():
+    get_job_manager().start()
+
+
+async def stop_job_manager():
+    global _job_manager
+    if _job_manager is not None:
+        await _job_manager.stop()
+        _job_manager = None
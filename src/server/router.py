@@ -1,25 +1,151 @@
+from uuid import uuid4
+
 from blaxel.telemetry.span import SpanManager
-from fastapi import APIRouter
-from fastapi.responses import StreamingResponse
+from fastapi import APIRouter, HTTPException, status
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from starlette.background import BackgroundTask
 
-from ..agent import agent
-from ..inputs import DeepSearchInput
+from ..agent import (
+    claim_run,
+    get_run,
+    refresh_events,
+    release_run,
+    resume_events,
+    run_batch,
+    run_status,
+    stream_events,
+)
+from ..agent.cache import get_report_cache, get_search_cache
+from ..agent.metrics import render_prometheus
+from ..agent.models import get_model_registry
+from ..agent.refresh import RefreshInput
+from ..agent.resilience import resilience_stats
+from ..agent.scheduler import scheduler_stats
+from ..agent.search import search_stats
+from ..inputs import BatchInput, DeepSearchInput
+from .jobs import QueueFullError, get_job_manager
+from .sse import sse_stream
 
 router = APIRouter()
 
+# Headers to disable proxy/CDN buffering (CloudFront, nginx, etc.)
+STREAM_HEADERS = {
+    "Cache-Control": "no-cache, no-transform",
+    "X-Accel-Buffering": "no",
+    "Connection": "keep-alive",
+}
+
 
 @router.post("/")
 async def handle_request(request: DeepSearchInput):
     with SpanManager("blaxel-langchain-deepresearch").create_active_span(
         "agent-request", {}
     ):
-        # Headers to disable proxy/CDN buffering (CloudFront, nginx, etc.)
+        run_id = uuid4().hex
+        return StreamingResponse(
+            sse_stream(stream_events(request, run_id)),
+            media_type="text/event-stream",
+            headers={**STREAM_HEADERS, "X-Run-Id": run_id},
+        )
+
+
+@router.post("/refresh")
+async def handle_refresh(request: RefreshInput):
+    with SpanManager("blaxel-langchain-deepresearch").create_active_span(
+        "agent-refresh", {"sections": len(request.sections)}
+    ):
+        run_id = uuid4().hex
+        return StreamingResponse(
+            sse_stream(refresh_events(request, run_id)),
+            media_type="text/event-stream",
+            headers={**STREAM_HEADERS, "X-Run-Id": run_id},
+        )
+
+
+@router.post("/batch")
+async def handle_batch(request: BatchInput):
+    with SpanManager("blaxel-langchain-deepresearch").create_active_span(
+        "agent-batch", {"items": len(request.items)}
+    ):
+        return await run_batch(request.items)
+
+
+@router.get("/runs/{run_id}")
+async def handle_run_status(run_id: str):
+    snapshot = await get_run(run_id)
+    if snapshot is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Run not found")
+    return run_status(run_id, snapshot)
+
+
+@router.post("/runs/{run_id}/resume")
+async def handle_run_resume(run_id: str, stream_tokens: bool = False):
+    snapshot = await get_run(run_id)
+    if snapshot is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Run not found")
+    # claimed before responding, so a second resume sent meanwhile gets a 409
+    if not claim_run(run_id):
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT, detail="Run is still in progress"
+        )
+    with SpanManager("blaxel-langchain-deepresearch").create_active_span(
+        "agent-resume", {"run_id": run_id}
+    ):
         return StreamingResponse(
-            agent(request),
+            sse_stream(resume_events(run_id, snapshot, stream_tokens)),
             media_type="text/event-stream",
-            headers={
-                "Cache-Control": "no-cache, no-transform",
-                "X-Accel-Buffering": "no",
-                "Connection": "keep-alive",
-            },
+            headers={**STREAM_HEADERS, "X-Run-Id": run_id},
+            background=BackgroundTask(release_run, run_id),
         )
+
+
+@router.post("/jobs", status_code=status.HTTP_202_ACCEPTED)
+async def handle_job_submit(request: DeepSearchInput):
+    try:
+        job = await get_job_manager().submit(request)
+    except QueueFullError as e:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=str(e))
+    return {"job_id": job.id, "status": job.status}
+
+
+@router.get("/jobs/{job_id}")
+async def handle_job_status(job_id: str):
+    job = await get_job_manager().store.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Job not found")
+    return job.summary()
+
+
+@router.get("/jobs/{job_id}/report")
+async def handle_job_report(job_id: str):
+    job = await get_job_manager().store.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Job not found")
+    if job.report is None:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"Job is {job.status}" + (f": {job.error}" if job.error else ""),
+        )
+    return {"job_id": job.id, "report": job.report}
+
+
+@router.get("/stats")
+async def handle_stats():
+    search_cache = get_search_cache()
+    report_cache = get_report_cache()
+    return {
+        "scheduler": scheduler_stats(),
+        "resilience": resilience_stats(),
+        "search_cache": search_cache.stats() if search_cache else None,
+        "searches": search_stats(),
+        "report_cache": report_cache.stats() if report_cache else None,
+        "models": get_model_registry().stats(),
+        "jobs": get_job_manager().stats(),
+    }
+
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def handle_metrics():
+    return PlainTextResponse(
+        render_prometheus(), media_type="text/plain; version=0.0.4; charset=utf-8"
+    )
@@ -0,0 +1,116 @@
+import asyncio
+import logging
+import os
+import time
+from contextlib import suppress
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from pydantic import BaseModel
+
+from ..agent.searchtypes import Section
+
+logger = logging.getLogger(__name__)
+
+HEARTBEAT_INTERVAL = float(os.getenv("SSE_HEARTBEAT_INTERVAL", "15"))
+
+
+# JSON payloads sent in the `data:` field, one model per SSE event type
+class RunEvent(BaseModel):
+    run_id: str
+    cached: bool = False
+
+
+class LogEvent(BaseModel):
+    level: str
+    message: str
+
+
+class SectionEvent(BaseModel):
+    name: str
+    index: int
+    content: str
+
+
+class TokenEvent(BaseModel):
+    name: Optional[str] = None
+    index: Optional[int] = None
+    content: str
+
+
+class FinalEvent(BaseModel):
+    report: str
+    # with their sources, the body of a later POST /refresh
+    sections: List[Section] = []
+
+
+class ErrorEvent(BaseModel):
+    message: str
+
+
+class HeartbeatEvent(BaseModel):
+    time: float
+
+
+def format_sse(event: str, payload: BaseModel) -> str:
+    return f"event: {event}\ndata: {payload.model_dump_json()}\n\n"
+
+
+def encode_event(event: Dict[str, Any]) -> str:
+    """Encode an agent event dict (see agent.stream_events) as an SSE message"""
+    kind = event["event"]
+    if kind == "run":
+        payload = RunEvent(run_id=event["run_id"], cached=event.get("cached", False))
+    elif kind == "log":
+        payload = LogEvent(level=event["level"], message=event["log"])
+    elif kind == "section":
+        payload = SectionEvent(
+            name=event["name"], index=event["index"], content=event["content"]
+        )
+    elif kind == "token":
+        payload = TokenEvent(
+            name=event.get("name"), index=event.get("index"), content=event["content"]
+        )
+    elif kind == "final":
+        payload = FinalEvent(report=event["report"], sections=event.get("sections", []))
+    elif kind == "error":
+        payload = ErrorEvent(message=event["message"])
+    else:
+        raise ValueError(f"Unknown event type: {kind}")
+    return format_sse(kind, payload)
+
+
+async def sse_stream(
+    events: AsyncIterator[Dict[str, Any]],
+    heartbeat_interval: float = HEARTBEAT_INTERVAL,
+) -> AsyncIterator[str]:
+    """Encode agent events as SSE, with a heartbeat whenever no event came for heartbeat_interval seconds.
+
+    The heartbeats keep proxies and load balancers from closing the connection
+    during long LLM calls, and let clients detect a dead stream.
+    """
+    iterator = aiter(events)
+    next_event = asyncio.ensure_future(anext(iterator))
+    try:
+        while True:
+            done, _ = await asyncio.wait({next_event}, timeout=heartbeat_interval)
+            if not done:
+                yield format_sse("heartbeat", HeartbeatEvent(time=time.time()))
+                continue
+            try:
+                event = next_event.result()
+            except StopAsyncIteration:
+                return
+            except Exception as e:
+                logger.error(f"Error during report stream: {e}", exc_info=e)
+                yield format_sse("error", ErrorEvent(message=str(e)))
+                return
+            yield encode_event(event)
+            next_event = asyncio.ensure_future(anext(iterator))
+    finally:
+        # client went away or the stream ended: stop the pending step, then the generator
+        if not next_event.done():
+            next_event.cancel()
+            with suppress(BaseException):
+                await next_event
+        with suppress(Exception):
+            await iterator.aclose()
@@ -0,0 +1,46 @@
+import os
+
+# the real clients are never called, but their settings are read at import time
+os.environ.setdefault("BL_WORKSPACE", "test")
+os.environ.setdefault("BL_API_KEY", "test")
+
+import pytest  # noqa: E402
+
+from benchmarks.fakes import FakeChatModel, FakeSearchClient, Latency  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def fresh_providers(monkeypatch):
+    """Process-wide limiters, resilient callers, caches and in-flight searches, new for each test"""
+    from src.agent import cache, resilience, scheduler, search
+
+    monkeypatch.setattr(scheduler, "_limiters", {})
+    monkeypatch.setattr(resilience, "_callers", {})
+    monkeypatch.setattr(cache, "_search_cache", None)
+    monkeypatch.setattr(cache, "_report_cache", None)
+    monkeypatch.setattr(search, "_in_flight", {})
+
+
+@pytest.fixture
+def fake_llm(monkeypatch):
+    """Deterministic chat model answering after about 0.2s, in place of bl_model"""
+    from src.agent import models
+
+    llm = FakeChatModel(latency=Latency(0.2, sigma=0.01))
+
+    async def fake_bl_model(name: str) -> FakeChatModel:
+        return llm
+
+    monkeypatch.setattr(models, "bl_model", fake_bl_model)
+    monkeypatch.setattr(models, "_registry", None)
+    return llm
+
+
+@pytest.fixture
+def fake_search(monkeypatch):
+    """Deterministic search client in place of the Tavily client"""
+    from src.agent import tavily
+
+    client = FakeSearchClient(latency=Latency(0.01, sigma=0.01), page_words=200)
+    monkeypatch.setattr(tavily, "_search_client", client)
+    return client
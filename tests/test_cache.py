@@ -0,0 +1,112 @@
+import asyncio
+import time
+
+from src.agent.cache import SearchCache, SqliteCache, TTLCache, search_response_size
+
+
+def test_ttl_cache_evicts_least_recently_used():
+    cache = TTLCache(max_size=2, ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1 and cache.get("c") == 3
+    assert cache.stats()["size"] == 2
+
+
+def test_ttl_cache_expires_entries():
+    cache = TTLCache(max_size=10, ttl=60)
+    cache.set("fresh", 1)
+    cache.set("stale", 2, expires_at=time.time() - 1)
+    assert cache.get("fresh") == 1
+    assert cache.get("stale") is None
+    assert cache.stats()["size"] == 1
+
+
+def test_ttl_cache_is_bounded_by_bytes():
+    cache = TTLCache(max_size=100, ttl=60, max_bytes=100, sizeof=len)
+    for key in "abcd":
+        cache.set(key, "x" * 30)
+    # the fourth entry pushes the total to 120 bytes, so the oldest goes
+    assert cache.get("a") is None
+    assert cache.bytes == 90
+    cache.set("b", "x" * 10)
+    assert cache.bytes == 70
+    # too large to keep at all, and the other entries stay
+    cache.set("huge", "x" * 101)
+    assert cache.get("huge") is None
+    assert cache.bytes == 70 and cache.stats()["size"] == 3
+    cache.clear()
+    assert cache.bytes == 0
+
+
+def _response(raw_words: int) -> dict:
+    return {
+        "results": [
+            {
+                "url": f"https://example.com/{i}",
+                "title": "title",
+                "content": "snippet",
+                "raw_content": "word " * raw_words,
+            }
+            for i in range(5)
+        ]
+    }
+
+
+def test_search_cache_memory_tier_is_bounded_by_bytes():
+    response = _response(20_000)
+    size = search_response_size(response)
+    cache = SearchCache(max_size=1024, ttl=60, max_bytes=3 * size)
+
+    async def main():
+        for i in range(10):
+            await cache.set(f"query {i}", response)
+
+    asyncio.run(main())
+    stats = cache.stats()["memory"]
+    assert stats["size"] == 3
+    assert stats["bytes"] <= 3 * size
+
+
+def test_sqlite_cache_evicts_least_recently_used_rows(tmp_path):
+    cache = SqliteCache(str(tmp_path / "cache.sqlite"), ttl=60, max_rows=3, prune_every=1)
+
+    async def main():
+        for i in range(3):
+            await cache.set(f"key {i}", {"i": i})
+        # key 0 is used again, so key 1 is now the least recently used
+        assert (await cache.get("key 0"))[1] == {"i": 0}
+        await cache.set("key 3", {"i": 3})
+        assert await cache.get("key 1") is None
+        assert await cache.get("key 0") is not None
+
+    asyncio.run(main())
+    stats = cache.stats()
+    assert stats["rows"] == 3 and stats["evicted"] == 1
+    cache.close()
+
+
+def test_sqlite_cache_is_bounded_by_bytes(tmp_path):
+    cache = SqliteCache(str(tmp_path / "cache.sqlite"), ttl=60, max_bytes=3000, prune_every=1)
+
+    async def main():
+        for i in range(10):
+            await cache.set(f"key {i}", "x" * 998)
+
+    asyncio.run(main())
+    assert cache.stats()["rows"] == 3 and cache.stats()["bytes"] <= 3000
+    cache.close()
+
+
+def test_sqlite_cache_drops_expired_rows_nobody_reads(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    cache = SqliteCache(path, ttl=-1, prune_every=100)
+    asyncio.run(cache.set("key", "value"))
+    assert cache.stats()["rows"] == 1
+    cache.close()
+    # pruned when the cache is opened again, as every prune_every writes
+    cache = SqliteCache(path, ttl=-1)
+    assert cache.stats()["rows"] == 0
+    cache.close()
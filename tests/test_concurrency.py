@@ -0,0 +1,46 @@
+"""The report graph awaits its LLM calls: sections and concurrent reports overlap"""
+
+import asyncio
+import time
+
+from langchain_core.messages import HumanMessage
+
+from src.agent import stream_events
+from src.agent.llmlogic import _ainvoke
+from src.inputs import DeepSearchInput
+
+LLM_LATENCY = 0.2
+
+
+def test_llm_calls_overlap(fake_llm):
+    async def main() -> float:
+        start = time.perf_counter()
+        await asyncio.gather(*(_ainvoke([HumanMessage(content=f"call {i}")]) for i in range(8)))
+        return time.perf_counter() - start
+
+    # serialized, 8 calls would take 8 * LLM_LATENCY
+    assert asyncio.run(main()) < 3 * LLM_LATENCY
+
+
+async def _report(topic: str) -> float:
+    start = time.perf_counter()
+    events = [event async for event in stream_events(DeepSearchInput(inputs=topic))]
+    assert events[-1]["event"] == "final"
+    return time.perf_counter() - start
+
+
+def test_sections_and_reports_overlap(fake_llm, fake_search):
+    # warm up the tokenizer and the model registry
+    asyncio.run(_report("overlap warm up"))
+    single = asyncio.run(_report("overlap baseline"))
+
+    async def concurrent() -> float:
+        start = time.perf_counter()
+        await asyncio.gather(*(_report(f"overlap topic {i}") for i in range(4)))
+        return time.perf_counter() - start
+
+    # four reports side by side take about as long as one, not four times as long
+    assert asyncio.run(concurrent()) < 2 * single
+    # a report makes 12 LLM calls (2 to plan, 2 per research section, 1 per
+    # final section) but only 5 of them are on its critical path
+    assert single < 9 * LLM_LATENCY
@@ -0,0 +1,54 @@
+from src.agent.dedup import QueryDeduper, jaccard, query_shingles
+
+
+def test_shingles_drop_stopwords_and_plurals():
+    assert query_shingles("What are the GPU prices for datacenters?") == {"gpu", "price", "datacenter"}
+    assert query_shingles("business class") == {"business", "class"}
+
+
+def test_jaccard():
+    assert jaccard(frozenset("ab"), frozenset("ab")) == 1.0
+    assert jaccard(frozenset("ab"), frozenset("bc")) == 1 / 3
+    assert jaccard(frozenset(), frozenset()) == 1.0
+
+
+def test_near_duplicates_are_searched_once():
+    deduper = QueryDeduper(threshold=0.75)
+    queries = deduper.dedupe(
+        [
+            "GPU market share by vendor",
+            "gpu market shares by vendors",
+            "Vendor GPU market share",
+            "datacenter power consumption",
+        ]
+    )
+    assert queries == ["GPU market share by vendor", "datacenter power consumption"]
+    assert deduper.seen == 4 and deduper.merged == 2
+    # later sections reuse the queries already searched for the report
+    assert deduper.canonical("the GPU market share by vendor?") == "GPU market share by vendor"
+
+
+def test_queries_with_different_numbers_are_kept():
+    deduper = QueryDeduper(threshold=0.5)
+    queries = ["GPU revenue 2023", "GPU revenue 2024", "GPU revenue Q3 2024", "GPU revenue"]
+    assert deduper.dedupe(queries) == queries
+    assert deduper.merged == 0
+
+
+def test_dissimilar_queries_are_kept():
+    deduper = QueryDeduper(threshold=0.75)
+    queries = ["GPU market share", "GPU market share forecast growth"]
+    assert deduper.dedupe(queries) == queries
+
+
+def test_queries_in_any_script_are_compared():
+    assert query_shingles("Énergétique renouvelable") == {"énergétique", "renouvelable"}
+    deduper = QueryDeduper(threshold=0.75)
+    queries = ["英伟达 市场份额", "人工智能 芯片 出口 限制", "Рынок графических процессоров"]
+    assert deduper.dedupe(queries) == queries
+    assert deduper.canonical("рынок графических процессоров?") == "Рынок графических процессоров"
+
+
+def test_queries_without_words_are_only_merged_when_identical():
+    deduper = QueryDeduper(threshold=0.75)
+    assert deduper.dedupe(["how to", "what is", "How to?"]) == ["how to", "what is"]
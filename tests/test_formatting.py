@@ -0,0 +1,92 @@
+import random
+import time
+
+from benchmarks.fakes import WORDS
+from src.agent.search import format_search_query_results
+from src.agent.searchtypes import Section
+from src.agent.utils import escape_dollars
+from src.agent.writer import format_sections
+
+
+def _text(rng: random.Random, words: int) -> str:
+    # a rotation of a fixed word list: varied enough and cheap to build in bulk
+    start = rng.randrange(len(WORDS))
+    cycle = WORDS[start:] + WORDS[:start]
+    return " ".join((cycle * (words // len(cycle) + 1))[:words])
+
+
+def _best_of(fn, repeat: int = 3) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def _responses(sources: int, raw_chars: int) -> list:
+    rng = random.Random(sources)
+    return [
+        {
+            "results": [
+                {
+                    "url": f"https://site{i}.example.com/{j}",
+                    "title": _text(rng, 5),
+                    "content": _text(rng, 40),
+                    "raw_content": _text(rng, raw_chars // 8)[:raw_chars],
+                }
+                for j in range(6)
+            ]
+        }
+        for i in range(sources // 6)
+    ]
+
+
+def _sections(count: int, words: int) -> list:
+    rng = random.Random(count)
+    return [
+        Section(
+            name=f"Section {i}",
+            description=_text(rng, 20),
+            research=True,
+            content=_text(rng, words) + " $1.5B \\$2",
+        )
+        for i in range(count)
+    ]
+
+
+def test_format_search_results_keeps_every_source():
+    text = format_search_query_results(_responses(36, 4000), max_tokens=200, include_raw_content=True)
+    assert text.count("Raw Content: ") == 36
+    assert text.count("\nURL: https://site") == 36
+
+
+def test_format_search_results_scales_linearly():
+    small, large = _responses(36, 40_000), _responses(144, 40_000)
+    format_search_query_results(small, include_raw_content=True)
+    small_seconds = _best_of(lambda: format_search_query_results(small, include_raw_content=True))
+    large_seconds = _best_of(lambda: format_search_query_results(large, include_raw_content=True))
+    # 4x the sources: a quadratic build would be about 16x slower
+    assert large_seconds < small_seconds * 8
+    assert large_seconds < 2.0
+
+
+def test_format_sections_throughput():
+    small, large = _sections(50, 2000), _sections(400, 2000)
+    assert format_sections(small).count("Section 50: Section 49") == 1
+    size = len(format_sections(large))
+    seconds = _best_of(lambda: format_sections(large))
+    # a join runs at hundreds of MB/s, a quadratic build falls far below
+    assert size / seconds > 50 * 2**20
+
+
+def test_escape_dollars():
+    text = "costs $5, already \\$6, TEMP_PLACEHOLDER stays"
+    assert escape_dollars(text) == "costs \\$5, already \\$6, TEMP_PLACEHOLDER stays"
+    assert escape_dollars(escape_dollars(text)) == escape_dollars(text)
+
+
+def test_escape_dollars_on_a_large_report():
+    report = "\n\n".join(section.content for section in _sections(400, 2000))
+    assert len(report) > 3_000_000
+    assert _best_of(lambda: escape_dollars(report)) < 0.5
@@ -0,0 +1,67 @@
+import asyncio
+from typing import Dict, List, Optional
+
+import pytest
+
+from src.inputs import DeepSearchInput
+from src.server import jobs
+from src.server.jobs import Job, JobManager, QueueFullError, ResultStore
+
+
+class SlowStore(ResultStore):
+    """Serializing store whose writes take a while, the first one longest, as a database's could"""
+
+    def __init__(self):
+        self.saved: Dict[str, Job] = {}
+        self.statuses: List[str] = []
+        self.delays = [0.05]
+
+    async def save(self, job: Job):
+        snapshot = job.model_copy(deep=True)
+        await asyncio.sleep(self.delays.pop() if self.delays else 0.001)
+        self.saved[job.id] = snapshot
+        self.statuses.append(snapshot.status)
+
+    async def get(self, job_id: str) -> Optional[Job]:
+        return self.saved.get(job_id)
+
+
+async def _events(request, run_id):
+    yield {"event": "final", "report": "report"}
+
+
+def test_queued_status_is_saved_before_the_worker_runs(monkeypatch):
+    monkeypatch.setattr(jobs, "stream_events", _events)
+    store = SlowStore()
+
+    async def main():
+        manager = JobManager(store, workers=1, queue_size=10)
+        manager.start()
+        job = await manager.submit(DeepSearchInput(inputs="topic"))
+        await manager._queue.join()
+        await manager.stop()
+        return job
+
+    job = asyncio.run(main())
+    assert store.statuses == ["queued", "running", "completed"]
+    assert store.saved[job.id].status == "completed"
+
+
+def test_full_queue_is_rejected(monkeypatch):
+    store = SlowStore()
+
+    async def main():
+        manager = JobManager(store, workers=0, queue_size=1)
+        # both find a free slot, then race for it while their job is saved
+        results = await asyncio.gather(
+            manager.submit(DeepSearchInput(inputs="first")),
+            manager.submit(DeepSearchInput(inputs="second")),
+            return_exceptions=True,
+        )
+        assert sorted(type(result).__name__ for result in results) == ["Job", "QueueFullError"]
+        with pytest.raises(QueueFullError):
+            await manager.submit(DeepSearchInput(inputs="third"))
+
+    asyncio.run(main())
+    # the job that lost the race for the last slot is not left queued
+    assert sorted(job.status for job in store.saved.values()) == ["failed", "queued"]
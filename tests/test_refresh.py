@@ -0,0 +1,102 @@
+import asyncio
+import json
+import time
+
+from langchain_core.utils.function_calling import convert_to_openai_tool
+
+from benchmarks.fakes import FakeChatModel
+from src.agent import refresh_events, stream_events
+from src.agent.refresh import RefreshInput, stale_sections
+from src.agent.searchtypes import Section, SectionSource, Sections
+from src.inputs import DeepSearchInput
+
+NOW = 1_000_000.0
+DAY = 86400.0
+
+
+def _research(name: str, *sources: SectionSource, content: str = "written") -> Section:
+    return Section(name=name, description=name, research=True, content=content, sources=list(sources))
+
+
+def _final(name: str, depends_on=(), content: str = "written") -> Section:
+    return Section(name=name, description=name, research=False, content=content, depends_on=list(depends_on))
+
+
+def _source(url: str, age: float) -> SectionSource:
+    return SectionSource(url=url, fetched_at=NOW - age)
+
+
+def test_fresh_sections_are_kept():
+    sections = [_research("Market", _source("https://a", 60)), _final("Conclusion")]
+    assert stale_sections(sections, max_age=DAY, now=NOW) == []
+
+
+def test_research_sections_with_old_changed_or_missing_sources_are_stale():
+    sections = [
+        _research("Old", _source("https://a", 60), _source("https://b", 2 * DAY)),
+        _research("Changed", _source("https://c", 60)),
+        _research("No sources"),
+        _research("Unknown age", SectionSource(url="https://d", fetched_at=None)),
+        _research("Unwritten", _source("https://e", 60), content=""),
+        _research("Fresh", _source("https://f", 60)),
+    ]
+    stale = stale_sections(sections, max_age=DAY, changed_urls=["https://c"], now=NOW)
+    assert stale == ["Old", "Changed", "No sources", "Unknown age", "Unwritten"]
+
+
+def test_final_sections_follow_the_sections_they_draw_on():
+    sections = [
+        _research("Market", _source("https://a", 2 * DAY)),
+        _research("Vendors", _source("https://b", 60)),
+        _final("Market outlook", depends_on=["Market"]),
+        _final("Vendor outlook", depends_on=["Vendors"]),
+        _final("Conclusion"),
+    ]
+    stale = stale_sections(sections, max_age=DAY, now=NOW)
+    # the conclusion draws on every research section
+    assert stale == ["Market", "Market outlook", "Conclusion"]
+
+
+def test_sources_are_left_out_of_the_planner_schema():
+    schema = json.dumps(convert_to_openai_tool(Sections))
+    assert "depends_on" in schema
+    assert "sources" not in schema
+    # still part of the sections sent to clients and read back on a refresh
+    section = _research("Market", _source("https://a", 60))
+    assert Section.model_validate(section.model_dump()).sources == section.sources
+
+
+def _events(stream):
+    async def collect():
+        return [event async for event in stream]
+
+    return asyncio.run(collect())
+
+
+def test_failed_plan_ends_with_an_error(monkeypatch, fake_llm, fake_search):
+    structured_output = FakeChatModel.with_structured_output
+
+    def failing_planner(self, schema, **kwargs):
+        if schema is Sections:
+            raise RuntimeError("planner is down")
+        return structured_output(self, schema, **kwargs)
+
+    monkeypatch.setattr(FakeChatModel, "with_structured_output", failing_planner)
+    monkeypatch.setenv("REPORT_CACHE_SIZE", "10")
+    for _ in range(2):
+        events = _events(stream_events(DeepSearchInput(inputs="failed plan")))
+        assert events[-1]["event"] == "error"
+        assert not any(event["event"] == "final" for event in events)
+        # nothing was cached, so the second request plans again
+        assert not events[0].get("cached")
+
+
+def test_refresh_with_nothing_stale_compiles_the_report(fake_llm, fake_search):
+    now = time.time()
+    sections = [
+        _research("Market", SectionSource(url="https://a", fetched_at=now)),
+        _final("Conclusion"),
+    ]
+    events = _events(refresh_events(RefreshInput(inputs="topic", sections=sections)))
+    assert events[-1]["event"] == "final"
+    assert "written" in events[-1]["report"]
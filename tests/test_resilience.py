@@ -0,0 +1,162 @@
+import asyncio
+
+import pytest
+from langchain_core.exceptions import OutputParserException
+
+from benchmarks.fakes import Latency
+from src.agent.resilience import CircuitBreaker, CircuitOpenError, ResilientCaller, get_caller
+from src.agent.scheduler import RateLimiter
+from src.agent.search import run_search_queries
+
+
+class HTTPError(Exception):
+    def __init__(self, status: int):
+        super().__init__(f"HTTP {status}")
+        self.status = status
+
+
+def _caller(**kwargs) -> ResilientCaller:
+    options = {
+        "timeout": 1.0,
+        "retries": 2,
+        "backoff": 0.001,
+        "hedge_after": None,
+        "breaker": CircuitBreaker(failure_threshold=3, reset_timeout=60),
+    }
+    return ResilientCaller("test", **(options | kwargs))
+
+
+def _flaky(failures: int, error: Exception):
+    calls = 0
+
+    async def fn():
+        nonlocal calls
+        calls += 1
+        if calls <= failures:
+            raise error
+        return calls
+
+    return fn
+
+
+def test_transient_errors_are_retried():
+    caller = _caller()
+    assert asyncio.run(caller.call(_flaky(2, HTTPError(503)))) == 3
+    assert caller.retried == 2 and caller.failures == 0
+    assert caller.breaker.state == "closed"
+
+
+def test_client_errors_are_not_retried():
+    caller = _caller()
+    with pytest.raises(HTTPError):
+        asyncio.run(caller.call(_flaky(1, HTTPError(400))))
+    assert caller.retried == 0 and caller.breaker.failures == 0
+
+
+def test_breaker_opens_and_recovers():
+    caller = _caller(retries=0, breaker=CircuitBreaker(failure_threshold=2, reset_timeout=0.05))
+
+    async def main():
+        for _ in range(2):
+            with pytest.raises(HTTPError):
+                await caller.call(_flaky(1, HTTPError(503)))
+        assert caller.breaker.state == "open"
+        with pytest.raises(CircuitOpenError):
+            await caller.call(_flaky(0, HTTPError(503)))
+        await asyncio.sleep(0.06)
+        # half-open: one trial call, whose success closes the circuit
+        assert caller.breaker.state == "half_open"
+        assert await caller.call(_flaky(0, HTTPError(503))) == 1
+        assert caller.breaker.state == "closed"
+
+    asyncio.run(main())
+    assert caller.short_circuited == 1
+
+
+def test_timeouts_are_retried():
+    caller = _caller(timeout=0.05, retries=1)
+    calls = 0
+
+    async def slow_then_fast():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(1 if calls == 1 else 0)
+        return calls
+
+    assert asyncio.run(caller.call(slow_then_fast)) == 2
+    assert caller.timeouts == 1
+
+
+def test_hedged_request_wins_when_the_first_is_slow():
+    caller = _caller(hedge_after=0.05)
+    calls = 0
+
+    async def first_slow():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(1 if calls == 1 else 0.01)
+        return calls
+
+    assert asyncio.run(caller.call(first_slow)) == 2
+    assert caller.hedged == 1 and caller.hedge_wins == 1
+
+
+def test_queue_wait_is_not_part_of_the_deadline():
+    limiter = RateLimiter("test", max_in_flight=4)
+    caller = _caller(timeout=0.3, slot=limiter.slot)
+
+    async def call():
+        await asyncio.sleep(0.1)
+        return True
+
+    async def main():
+        # 40 calls, 4 at a time: the last ones queue for about 0.9s
+        return await asyncio.gather(*(caller.call(call) for _ in range(40)))
+
+    assert all(asyncio.run(main()))
+    assert caller.timeouts == 0 and caller.breaker.state == "closed"
+
+
+def test_queued_searches_do_not_open_the_circuit(monkeypatch, fake_search):
+    monkeypatch.setenv("SEARCH_MAX_IN_FLIGHT", "4")
+    monkeypatch.setenv("SEARCH_TIMEOUT", "0.3")
+    fake_search.latency = Latency(0.05, sigma=0.01)
+    # advanced searches take twice the latency: 10 waves of 0.1s
+    results = asyncio.run(run_search_queries([f"query {i}" for i in range(40)]))
+    assert len(results) == 40
+    assert get_caller("search").timeouts == 0
+    assert get_caller("search").breaker.state == "closed"
+
+
+def test_hedged_request_takes_its_own_slot():
+    limiter = RateLimiter("test", max_in_flight=2)
+    caller = _caller(timeout=2, hedge_after=0.05, slot=limiter.slot)
+    in_flight = peak = 0
+
+    async def slow():
+        nonlocal in_flight, peak
+        in_flight += 1
+        peak = max(peak, in_flight)
+        try:
+            await asyncio.sleep(0.2)
+        finally:
+            in_flight -= 1
+        return True
+
+    async def main():
+        return await asyncio.gather(*(caller.call(slow) for _ in range(4)))
+
+    assert all(asyncio.run(main()))
+    # the hedges wait for a slot instead of going past the limiter
+    assert peak == 2
+    assert caller.hedged >= 2
+
+
+def test_unparseable_answers_do_not_open_the_circuit():
+    caller = _caller(retries=0, breaker=CircuitBreaker(failure_threshold=1, reset_timeout=60))
+    with pytest.raises(OutputParserException):
+        asyncio.run(caller.call(_flaky(1, OutputParserException("not JSON"))))
+    assert caller.breaker.state == "closed"
+    # still retried: the next answer may parse
+    caller = _caller(retries=1)
+    assert asyncio.run(caller.call(_flaky(1, OutputParserException("not JSON")))) == 2
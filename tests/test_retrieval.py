@@ -0,0 +1,148 @@
+from src.agent.retrieval import PassageIndex, allocate_budget, chunk_passages, terms
+from src.agent.search import index_search_results, pack_passages
+from src.agent.sources import SourceStore
+
+
+def test_allocate_budget_splits_by_score():
+    allocation = allocate_budget([3.0, 1.0], [10, 10], [10_000, 10_000], budget=1000, min_tokens=0)
+    # the best source gets 3/4 of what is left after its header, the other one the rest
+    assert allocation == [742, 238]
+
+
+def test_allocate_budget_passes_unused_shares_on():
+    allocation = allocate_budget([3.0, 1.0], [10, 10], [100, 10_000], budget=1000, min_tokens=0)
+    assert allocation == [100, 880]
+
+
+def test_allocate_budget_leaves_out_sources_that_do_not_fit():
+    allocation = allocate_budget([3.0, 2.0, 1.0], [50, 50, 50], [500, 500, 500], budget=700, min_tokens=200)
+    assert allocation[0] is not None and allocation[1] is not None
+    assert allocation[2] is None
+    assert sum(tokens + 50 for tokens in allocation if tokens is not None) <= 700
+
+
+def _page(topic_words: str, paragraphs: int) -> str:
+    return "\n\n".join(f"{topic_words} paragraph {i} " + "filler text " * 60 for i in range(paragraphs))
+
+
+def _response() -> dict:
+    # one long page about the query, and two short ones that mention it less
+    return {
+        "results": [
+            {
+                "url": "https://long.example.com",
+                "title": "Long",
+                "content": "gpu market share",
+                "raw_content": _page("gpu market share gpu market share", 30),
+            },
+            {
+                "url": "https://short-a.example.com",
+                "title": "Short A",
+                "content": "gpu vendors",
+                "raw_content": _page("gpu market", 2),
+            },
+            {
+                "url": "https://short-b.example.com",
+                "title": "Short B",
+                "content": "market trends",
+                "raw_content": _page("market share", 2),
+            },
+        ]
+    }
+
+
+def test_pack_passages_shares_the_budget_between_sources():
+    store, index = SourceStore(), PassageIndex()
+    index_search_results(_response(), store, index, max_tokens=100_000)
+    text, tokens, sources = pack_passages("gpu market share", store, index, budget=1500)
+    assert tokens <= 1500
+    # the long page ranks best but cannot take the whole budget
+    assert {source.url for source in sources} == {
+        "https://long.example.com",
+        "https://short-a.example.com",
+        "https://short-b.example.com",
+    }
+    assert text.count("Source [") == 3
+
+
+def test_pack_passages_fills_the_budget():
+    store, index = SourceStore(), PassageIndex()
+    index_search_results(_response(), store, index, max_tokens=100_000)
+    _, tokens, _ = pack_passages("gpu market share", store, index, budget=3000)
+    # passages are about 130 tokens, so less than one is left unused
+    assert 3000 - 200 < tokens <= 3000
+
+
+def test_pack_passages_without_matches():
+    assert pack_passages("gpu", SourceStore(), PassageIndex()) == ("No search results found.", 0, [])
+
+
+def test_chunk_passages_follows_paragraphs():
+    text = "one two three\n\nfour five\n\n\n" + " ".join(f"w{i}" for i in range(25))
+    passages = chunk_passages(text, words=10)
+    assert passages[0] == "one two three four five"
+    assert [len(passage.split()) for passage in passages[1:]] == [10, 10, 5]
+
+
+def test_index_ranks_passages_by_bm25():
+    index = PassageIndex()
+    index.add(1, "gpu prices", 2, "gpu supply was short, gpu prices rose", 8)
+    index.add(2, "cpu prices", 2, "cpu prices fell", 3)
+    index.add(3, "weather", 1, "rain is expected", 3)
+    ranked = index.search("gpu prices", k=10)
+    # both query terms first, then a rare term beats a common one
+    assert [passage.source_id for _, passage in ranked] == [1, 1, 2, 2]
+    assert [score for score, _ in ranked] == sorted((score for score, _ in ranked), reverse=True)
+    assert len(index.search("gpu prices", k=1)) == 1
+    assert index.search("nothing matches", k=10) == []
+
+
+def test_index_adds_each_source_once():
+    index = PassageIndex()
+    index.add(1, "gpu prices", 2)
+    assert len(index) == 1
+    index.add(1, "gpu prices", 2)
+    assert len(index) == 1
+    # the page arrives with a later search and is indexed then, once
+    index.add(1, "gpu prices", 2, "gpu prices rose\n\nsupply was short", 10)
+    index.add(1, "gpu prices", 2, "gpu prices rose\n\nsupply was short", 10)
+    assert len(index) == 2
+    assert index.passages[1].tokens == 10
+
+
+def test_terms_in_any_script():
+    assert terms("L'énergétique du Рынок 市场份额") == ["l", "énergétique", "du", "рынок", "市场份额"]
+
+
+def _russian_response() -> dict:
+    return {
+        "results": [
+            {
+                "url": "https://ru.example.com",
+                "title": "Рынок",
+                "content": "Рынок графических процессоров растёт",
+                "raw_content": "\n\n".join(
+                    f"Рынок графических процессоров, абзац {i}. " + "Спрос на ускорители растёт. " * 20
+                    for i in range(5)
+                ),
+            }
+        ]
+    }
+
+
+def test_pack_passages_in_another_script():
+    store, index = SourceStore(), PassageIndex()
+    index_search_results(_russian_response(), store, index, max_tokens=100_000)
+    text, tokens, sources = pack_passages("Рынок графических процессоров", store, index, budget=2000)
+    assert [source.url for source in sources] == ["https://ru.example.com"]
+    assert "графических процессоров" in text and 0 < tokens <= 2000
+
+
+def test_pack_passages_falls_back_to_unranked_sources():
+    store, index = SourceStore(), PassageIndex()
+    index_search_results(_response(), store, index, max_tokens=100_000)
+    # only stopwords: nothing to rank by, every source still gets a share
+    text, tokens, sources = pack_passages("what is the", store, index, budget=1500)
+    assert len(sources) == 3
+    assert 0 < tokens <= 1500
+    assert text.count("Source [") == 3
@@ -0,0 +1,75 @@
+"""Checkpointed runs: the memory checkpointer is bounded and a run is resumed once at a time"""
+
+import asyncio
+import importlib
+from typing import TypedDict
+
+import pytest
+from fastapi import HTTPException
+from langgraph.graph import END, START, StateGraph
+
+from src.agent import is_run_active
+from src.agent.checkpoint import BoundedMemorySaver
+from src.server import router
+
+
+class _State(TypedDict):
+    count: int
+
+
+def _graph(checkpointer):
+    builder = StateGraph(_State)
+    builder.add_node("step", lambda state: {"count": state["count"] + 1})
+    builder.add_edge(START, "step")
+    builder.add_edge("step", END)
+    return builder.compile(checkpointer=checkpointer)
+
+
+def _run(graph, thread_id: str):
+    asyncio.run(graph.ainvoke({"count": 0}, {"configurable": {"thread_id": thread_id}}))
+
+
+def test_memory_checkpointer_keeps_the_latest_runs():
+    checkpointer = BoundedMemorySaver(max_runs=3, ttl=0)
+    graph = _graph(checkpointer)
+    for i in range(10):
+        _run(graph, f"run {i}")
+    assert set(checkpointer.storage) == {"run 7", "run 8", "run 9"}
+    assert checkpointer.evicted == 7
+    assert all(key[0] in checkpointer.storage for key in checkpointer.blobs)
+    assert all(key[0] in checkpointer.storage for key in checkpointer.writes)
+
+
+def test_memory_checkpointer_forgets_idle_runs(monkeypatch):
+    checkpointer = BoundedMemorySaver(max_runs=0, ttl=60)
+    graph = _graph(checkpointer)
+    _run(graph, "old")
+    now = checkpointer._written["old"]
+    monkeypatch.setattr("src.agent.checkpoint.time.time", lambda: now + 120)
+    _run(graph, "new")
+    assert set(checkpointer.storage) == {"new"}
+
+
+def test_concurrent_resume_is_rejected(monkeypatch):
+    async def get_run(run_id):
+        return object()
+
+    async def resume_events(run_id, snapshot, stream_tokens):
+        yield {"event": "final", "report": ""}
+
+    monkeypatch.setattr(router, "get_run", get_run)
+    monkeypatch.setattr(router, "resume_events", resume_events)
+    # src.agent.agent is shadowed by the agent function re-exported by src.agent
+    monkeypatch.setattr(importlib.import_module("src.agent.agent"), "_active_runs", set())
+
+    async def main():
+        # the stream of the first response has not started yet
+        response = await router.handle_run_resume("run")
+        assert is_run_active("run")
+        with pytest.raises(HTTPException) as error:
+            await router.handle_run_resume("run")
+        assert error.value.status_code == 409
+        await response.background()
+        assert not is_run_active("run")
+
+    asyncio.run(main())
@@ -0,0 +1,64 @@
+import asyncio
+import time
+
+from src.agent.scheduler import RateLimiter
+
+
+def test_limiter_caps_in_flight_calls():
+    limiter = RateLimiter("test", max_in_flight=3)
+    peak = 0
+
+    async def call():
+        nonlocal peak
+        async with limiter.slot():
+            peak = max(peak, limiter.in_flight)
+            await asyncio.sleep(0.01)
+
+    async def main():
+        await asyncio.gather(*(call() for _ in range(20)))
+
+    asyncio.run(main())
+    assert peak == 3
+    assert limiter.completed == 20
+    assert limiter.in_flight == 0 and limiter.queued == 0
+
+
+def test_token_bucket_spreads_calls_over_time():
+    limiter = RateLimiter("test", max_in_flight=100, rps=50)
+
+    async def call():
+        async with limiter.slot():
+            pass
+
+    async def main() -> float:
+        start = time.monotonic()
+        await asyncio.gather(*(call() for _ in range(25)))
+        return time.monotonic() - start
+
+    # the bucket starts with 50 tokens (one second of burst), then refills at 50/s
+    assert asyncio.run(main()) < 0.1
+
+    async def burst() -> float:
+        start = time.monotonic()
+        await asyncio.gather(*(call() for _ in range(50)))
+        return time.monotonic() - start
+
+    # 25 tokens were left: the other 25 calls wait about half a second
+    assert 0.4 < asyncio.run(burst()) < 1.0
+
+
+def test_cancelled_waiter_releases_its_slot():
+    limiter = RateLimiter("test", max_in_flight=1)
+
+    async def main():
+        async with limiter.slot():
+            waiter = asyncio.ensure_future(limiter.slot().__aenter__())
+            await asyncio.sleep(0.01)
+            waiter.cancel()
+            await asyncio.gather(waiter, return_exceptions=True)
+        # the slot is free again
+        async with limiter.slot():
+            pass
+
+    asyncio.run(asyncio.wait_for(main(), 1))
+    assert limiter.queued == 0
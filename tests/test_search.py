@@ -0,0 +1,56 @@
+"""Adaptive section searches: basic results are kept, escalations are not cut as stragglers"""
+
+import asyncio
+
+from src.agent import tavily
+from src.agent.search import iter_search_results, search_stats
+
+TOPIC = "gpu market share"
+
+
+class AdaptiveSearchClient:
+    """Basic searches answer fast; those for "thin" queries cover the topic poorly"""
+
+    def __init__(self):
+        self.calls = []
+
+    async def raw_results_async(self, query, max_results=5, search_depth="advanced", include_answer=False, include_raw_content=False):
+        self.calls.append((query, search_depth))
+        await asyncio.sleep(0.02 if search_depth == "basic" else 0.2)
+        thin = query.startswith("thin")
+        results = [
+            {
+                "url": f"https://site{0 if thin else i}.example.com/{query.replace(' ', '-')}/{i}",
+                "title": "weather" if thin else "GPU market",
+                "content": "rain" if thin else "gpu market share by vendor",
+                **({"raw_content": "gpu market share " * 50} if include_raw_content else {}),
+            }
+            for i in range(max_results)
+        ]
+        return {"query": query, "results": results}
+
+
+async def _collect(queries, **kwargs):
+    return [result async for result in iter_search_results(queries, topic=TOPIC, depth="adaptive", **kwargs)]
+
+
+def test_escalations_outlive_the_grace_period(monkeypatch):
+    client = AdaptiveSearchClient()
+    monkeypatch.setattr(tavily, "_search_client", client)
+    queries = ["covered 1", "covered 2", "covered 3", "thin 1", "thin 2"]
+    cancelled = search_stats()["cancelled"]
+    results = asyncio.run(_collect(queries, enough=0.6, grace=0.01, deadline=5))
+    # every basic result, then the advanced ones of the thin queries
+    assert sorted(result["query"] for result in results) == sorted(queries + ["thin 1", "thin 2"])
+    advanced = [result for result in results if "raw_content" in result["results"][0]]
+    assert sorted(result["query"] for result in advanced) == ["thin 1", "thin 2"]
+    assert search_stats()["cancelled"] == cancelled
+
+
+def test_escalations_stop_at_the_deadline(monkeypatch):
+    client = AdaptiveSearchClient()
+    monkeypatch.setattr(tavily, "_search_client", client)
+    results = asyncio.run(_collect(["covered 1", "thin 1"], deadline=0.1))
+    # the basic result of the thin query is still used
+    assert sorted(result["query"] for result in results) == ["covered 1", "thin 1"]
+    assert ("thin 1", "advanced") in client.calls
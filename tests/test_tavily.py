@@ -0,0 +1,59 @@
+"""The shared Tavily client reuses a bounded pool of keep-alive connections"""
+
+import asyncio
+
+from aiohttp import web
+
+from src.agent import tavily
+from src.agent.search import run_search_queries
+
+
+async def _serve(connections: set):
+    async def search(request: web.Request) -> web.Response:
+        # one client port per TCP connection
+        connections.add(request.transport.get_extra_info("peername"))
+        body = await request.json()
+        await asyncio.sleep(0.01)
+        return web.json_response(
+            {
+                "query": body["query"],
+                "results": [
+                    {"url": f"https://example.com/{body['query']}", "title": "t", "content": "c"}
+                ],
+            }
+        )
+
+    app = web.Application()
+    app.router.add_post("/search", search)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    return runner, f"http://127.0.0.1:{port}"
+
+
+def test_report_searches_reuse_pooled_connections(monkeypatch):
+    async def main():
+        connections = set()
+        runner, url = await _serve(connections)
+        client = tavily.TavilyClient(api_key="test", base_url=url, max_connections=4)
+        monkeypatch.setattr(tavily, "_search_client", client)
+        try:
+            # a report: 8 sections of 5 queries, searched concurrently
+            for report in range(2):
+                results = await asyncio.gather(
+                    *(
+                        run_search_queries([f"report {report} section {i} query {j}" for j in range(5)])
+                        for i in range(8)
+                    )
+                )
+                assert sum(len(docs) for docs in results) == 40
+                # at most max_connections are opened, and the second report opens none
+                assert client.connections_created <= 4
+                assert len(connections) == client.connections_created
+        finally:
+            await client.close()
+            await runner.cleanup()
+
+    asyncio.run(main())